@@ -0,0 +1,450 @@
+# backend/annotate.py
+
+import base64
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from decode import open_capture, av
+from inference import inference_service, UPLOAD
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("annotate")
+
+_END = object()     # end-of-stream marker passed between stages
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class PyAVWriter:
+    """cv2.VideoWriter-like H.264/MP4 encoder (browser-playable) backed by PyAV."""
+
+    def __init__(self, path: str, fps: float, size, crf: int = 23, preset: str = "veryfast"):
+        self.container = av.open(path, "w", options={"movflags": "+faststart"})
+        try:
+            self.stream = self.container.add_stream("libx264", rate=Fraction(fps).limit_denominator(1001))
+            self.stream.width, self.stream.height = size[0] // 2 * 2, size[1] // 2 * 2   # yuv420p needs even dims
+            self.stream.pix_fmt = "yuv420p"
+            self.stream.options = {"crf": str(crf), "preset": preset}
+        except Exception:
+            self.container.close()
+            raise
+
+    def write(self, frame: np.ndarray) -> None:
+        picture = av.VideoFrame.from_ndarray(frame, format="bgr24").reformat(
+            width=self.stream.width, height=self.stream.height, format="yuv420p")
+        for packet in self.stream.encode(picture):
+            self.container.mux(packet)
+
+    def release(self) -> None:
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+
+def open_writer(path: str, fps: float, size):
+    """
+    Open an MP4 writer, preferring H.264 so browsers can play the result.
+
+    Returns:
+        (writer, codec name)
+    """
+    if av is not None:
+        try:
+            return PyAVWriter(path, fps, size), "h264"
+        except Exception as e:
+            logger.warning(f"H.264 encoding via PyAV unavailable, falling back to OpenCV: {e}")
+
+    # pip's opencv-python has no H.264 encoder, so this usually ends at mp4v
+    for fourcc, codec in (("avc1", "h264"), ("mp4v", "mp4v")):
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if writer.isOpened():
+            return writer, codec
+        writer.release()
+    raise IOError("No MP4 encoder available")
+
+
+def interpolate(dets0: np.ndarray, dets1: np.ndarray, t: float, min_iou: float = 0.3) -> np.ndarray:
+    """
+    Boxes for a frame at fraction t between two sampled frames.
+
+    Boxes of the same class are paired greedily by IoU and moved linearly;
+    unpaired boxes are shown from the nearer sampled frame only.
+    """
+    out, used = [], set()
+    for d0 in dets0:
+        best, best_iou = None, min_iou
+        for j, d1 in enumerate(dets1):
+            if j in used or d1[5] != d0[5]:
+                continue
+            iou = _iou(d0, d1)
+            if iou > best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            out.append(d0 + (dets1[best] - d0) * t)
+        elif t < 0.5:
+            out.append(d0)
+    if t >= 0.5:
+        out.extend(d1 for j, d1 in enumerate(dets1) if j not in used)
+    return np.array(out, dtype=np.float32).reshape(-1, 6)
+
+
+class AnnotationJob:
+    """
+    Renders an annotated copy of a video with overlapped pipeline stages:
+
+        reader thread -> dispatch thread -> draw thread -> writer thread
+
+    The dispatch stage submits every sample_interval-th frame to the shared
+    inference service as soon as it is decoded (the service coalesces them
+    into micro-batches), the draw stage interpolates boxes for the frames in
+    between, and encoding runs on its own thread. Small bounded queues cap a
+    job at a few dozen decoded frames, so total time is set by the slowest stage.
+
+    The sampled frames' detections also give the upload's summary (peak
+    vehicle count, emergency flag and the annotated frame with the most
+    vehicles), reported with the job status, so the video only goes through
+    the model once.
+    """
+
+    def __init__(self, video_path: str, output_path: str, sample_interval: int = 5,
+                 max_side: int = 960, queue_size: int = 8, in_flight: int = 4,
+                 status_path: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.output_path = output_path
+        base, ext = os.path.splitext(output_path)
+        self.tmp_path = f"{base}.part{ext}"     # keep the extension so the muxer is picked correctly
+        self.sample_interval = max(1, sample_interval)
+        self.max_side = max_side
+        self.status_path = status_path  # Progress for workers that do not own the job
+        self.future = None              # Set when scheduled on AnnotationJobs' executor
+
+        self.state = "queued"           # queued | running | done | error
+        self.error = None
+        self.codec = None
+        self.total_frames = 0
+        self.frames_written = 0
+        self.fps = 25.0
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._saved_at = 0.0
+
+        # Upload summary from the sampled frames
+        self.frames_analyzed = 0
+        self.max_count = 0
+        self.emergency = False
+        self.best_frame = None          # Annotated sampled frame with the most vehicles
+        self.best_image = ""            # ... as base64 JPEG once the job finished
+
+        # Room for in_flight sampled frames (and the frames between them) awaiting
+        # inference; other jobs and the live feed fill the rest of a micro-batch
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.dispatched = queue.Queue(maxsize=queue_size + self.sample_interval * max(1, in_flight))
+        self.drawn = queue.Queue(maxsize=queue_size)
+        self.failed = threading.Event()
+
+    # ── stages ───────────────────────────────────────────────────────────────
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Put that gives up when another stage failed."""
+        while not self.failed.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self.failed.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _stage(self, name: str, fn):
+        def run():
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Annotation job {self.id} failed: {e}")
+                self.error = str(e)
+                self.failed.set()
+        return threading.Thread(target=run, name=f"annotate-{name}", daemon=True)
+
+    def _read(self, cap) -> None:
+        idx = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if not self._put(self.decoded, (idx, frame)):
+                break
+            idx += 1
+        cap.release()
+        self._put(self.decoded, _END)
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._get(self.decoded)
+            if item is _END:
+                break
+            idx, frame = item
+            future = inference_service.submit(frame, UPLOAD) if idx % self.sample_interval == 0 else None
+            if not self._put(self.dispatched, (idx, frame, future)):
+                return
+        self._put(self.dispatched, _END)
+
+    def _emit(self, frame: np.ndarray, dets: np.ndarray, sampled: bool = False) -> bool:
+        count, emergency = inference_service.detector.draw(frame, dets)
+        if sampled:
+            self.frames_analyzed += 1
+            self.emergency = self.emergency or emergency
+            if self.best_frame is None or count > self.max_count:
+                self.max_count = count
+                self.best_frame = frame.copy()
+        return self._put(self.drawn, frame)
+
+    def _draw(self) -> None:
+        prev = None                     # (index, detections) of the last sampled frame
+        segment = []                    # frames after prev awaiting the next sampled frame
+        while True:
+            item = self._get(self.dispatched)
+            if item is _END:
+                break
+            idx, frame, future = item
+            if future is None:
+                segment.append((idx, frame))
+                continue
+
+            dets = future.result()
+            for i, f in segment:
+                t = (i - prev[0]) / (idx - prev[0])
+                if not self._emit(f, interpolate(prev[1], dets, t)):
+                    return
+            segment = []
+            if not self._emit(frame, dets, sampled=True):
+                return
+            prev = (idx, dets)
+
+        # Frames after the last sampled frame keep its boxes
+        for i, f in segment:
+            if not self._emit(f, prev[1] if prev else np.zeros((0, 6), np.float32)):
+                return
+        self._put(self.drawn, _END)
+
+    def _write(self, size) -> None:
+        writer, self.codec = open_writer(self.tmp_path, self.fps, size)
+        try:
+            while True:
+                frame = self._get(self.drawn)
+                if frame is _END:
+                    break
+                writer.write(frame)
+                self.frames_written += 1
+                self.save_status(throttle=0.5)
+        finally:
+            writer.release()
+
+    # ── driver ───────────────────────────────────────────────────────────────
+
+    def run(self) -> None:
+        self.state = "running"
+        self.started_at = time.time()
+        self.save_status()
+        try:
+            cap = open_capture(self.video_path, self.max_side)
+            if not cap.isOpened():
+                raise IOError(f"Cannot open video file: {self.video_path}")
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+            # Peek the first frame for the output size, then rewind
+            ok, first = cap.read()
+            if not ok:
+                raise IOError(f"Video has no frames: {self.video_path}")
+            size = (first.shape[1], first.shape[0])
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+            # Make sure the model is loaded before timing the pipeline
+            if not inference_service.detector.ready:
+                inference_service.detector.load()
+
+            stages = [self._stage("read", lambda: self._read(cap)),
+                      self._stage("dispatch", self._dispatch),
+                      self._stage("draw", self._draw),
+                      self._stage("write", lambda: self._write(size))]
+            for stage in stages:
+                stage.start()
+            for stage in stages:
+                stage.join()
+
+            if self.failed.is_set():
+                raise RuntimeError(self.error or "pipeline stage failed")
+            if self.frames_analyzed == 0:
+                raise IOError("No frames could be analyzed")
+
+            os.replace(self.tmp_path, self.output_path)
+            self.state = "done"
+        except Exception as e:
+            self.state = "error"
+            self.error = str(e)
+            logger.error(f"Annotation job {self.id} failed: {e}")
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+        finally:
+            self.finished_at = time.time()
+            if self.best_frame is not None:
+                _, jpg = cv2.imencode(".jpg", self.best_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+                self.best_image = base64.b64encode(jpg).decode()
+                self.best_frame = None
+            self.save_status()
+
+        if self.state == "done":
+            elapsed = self.finished_at - self.started_at
+            video_seconds = self.frames_written / self.fps if self.fps else 0
+            logger.info(f"Annotated {self.frames_written} frames in {elapsed:.1f}s "
+                        f"({video_seconds / max(elapsed, 1e-6):.1f}x real time)")
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Stop a running job; its stages wind down within a queue timeout."""
+        self.error = self.error or reason
+        self.failed.set()
+
+    def status(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "error": self.error,
+            "output_file": os.path.basename(self.output_path),
+            "codec": self.codec,
+            "browser_playable": self.codec == "h264" if self.codec else None,
+            "queued_seconds": round((self.started_at or time.time()) - self.queued_at, 2),
+            "frames_written": self.frames_written,
+            "total_frames": self.total_frames,
+            "progress": round(min(1.0, self.frames_written / self.total_frames), 3) if self.total_frames else None,
+            "elapsed_seconds": round(elapsed, 2),
+            "speed_x_realtime": round(self.frames_written / self.fps / elapsed, 2) if elapsed > 0 and self.fps else None,
+            # Upload analysis so far; the annotated frame is added once the job is done
+            "frames_analyzed": self.frames_analyzed,
+            "count": self.max_count,
+            "emergency": self.emergency,
+            "image": self.best_image if self.state == "done" else None,
+        }
+
+    def save_status(self, throttle: float = 0.0) -> None:
+        """Write status() to status_path (atomically) for other workers to serve."""
+        if self.status_path is None or time.time() - self._saved_at < throttle:
+            return
+        self._saved_at = time.time()
+        tmp = f"{self.status_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as fh:
+                json.dump(self.status(), fh)
+            os.replace(tmp, self.status_path)
+        except OSError as e:
+            logger.warning(f"Cannot save status of annotation job {self.id}: {e}")
+
+
+class AnnotationJobs:
+    """
+    Registry running annotation jobs on a bounded executor.
+
+    Each running job buffers a few dozen decoded frames, so only
+    max_concurrent jobs run at once and the rest wait in state "queued".
+    Job status is also written to status_dir so any worker process can
+    report progress for jobs owned by another.
+    """
+
+    def __init__(self, max_jobs: int = 100, max_concurrent: int = 2,
+                 status_dir: str = os.path.join("app_data", "render_jobs")):
+        self.jobs: Dict[str, AnnotationJob] = {}
+        self.max_jobs = max_jobs
+        self.status_dir = status_dir
+        self.max_concurrent = max_concurrent
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def start(self, video_path: str, output_path: str, **kwargs) -> AnnotationJob:
+        os.makedirs(self.status_dir, exist_ok=True)
+        job = AnnotationJob(video_path, output_path, **kwargs)
+        job.status_path = self._status_path(job.id)
+        with self.lock:
+            # Forget the oldest finished jobs
+            finished = [j for j in self.jobs.values() if j.state in ("done", "error")]
+            for old in finished[:max(0, len(self.jobs) - self.max_jobs + 1)]:
+                self.jobs.pop(old.id, None)
+                try:
+                    os.remove(old.status_path)
+                except OSError:
+                    pass
+            self.jobs[job.id] = job
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                                   thread_name_prefix="annotate")
+            executor = self.executor
+        job.save_status()
+        job.future = executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnnotationJob]:
+        return self.jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        """Drop queued jobs and stop running ones (before stopping the inference service)."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            for job in self.jobs.values():
+                if job.state == "running":
+                    job.cancel("server shutting down")
+                elif job.state == "queued" and job.future is not None and job.future.cancelled():
+                    job.state, job.error = "error", "server shutting down"
+                    job.save_status()
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Status of a job owned by this process, or as last saved by the owning process."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.status()
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self._status_path(job_id)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+
+# Create job registry instance for export
+annotation_jobs = AnnotationJobs()
@@ -0,0 +1,175 @@
+# backend/batch.py
+
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("batch")
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_image(filename: str) -> bool:
+    return os.path.splitext(filename.lower())[1] in IMAGE_EXTENSIONS
+
+
+def spool_uploads(uploads, directory: str = None) -> List[Tuple[str, str]]:
+    """
+    Copy uploaded files to temporary files owned by the caller.
+
+    The web framework closes its upload objects once the endpoint returns,
+    which is before a streamed response is produced, so batch processing
+    has to work from its own copies. Remove them with remove_spooled().
+
+    Returns:
+        (filename, temporary path) per upload
+    """
+    spooled = []
+    try:
+        for upload in uploads:
+            name = upload.filename or "upload"
+            upload.file.seek(0)
+            with tempfile.NamedTemporaryFile(prefix="batch-", suffix=os.path.splitext(name)[1],
+                                             dir=directory, delete=False) as tmp:
+                spooled.append((name, tmp.name))
+                shutil.copyfileobj(upload.file, tmp)
+    except Exception:
+        remove_spooled(spooled)
+        raise
+    return spooled
+
+
+def remove_spooled(spooled: List[Tuple[str, str]]) -> None:
+    for _, path in spooled:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def iter_images(spooled: List[Tuple[str, str]]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (name, encoded bytes) for every image in the spooled uploads,
+    expanding zip/tar archives member by member so only one member is held
+    at a time. Non-image entries are yielded with None bytes so they can be
+    reported.
+    """
+    for name, path in spooled:
+        if is_archive(name):
+            if name.lower().endswith(".zip"):
+                with zipfile.ZipFile(path) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir():
+                            continue
+                        member = f"{name}/{info.filename}"
+                        yield member, zf.read(info) if is_image(info.filename) else None
+            else:
+                with tarfile.open(path, mode="r|*") as tf:
+                    for info in tf:
+                        if not info.isfile():
+                            continue
+                        member = f"{name}/{info.name}"
+                        if is_image(info.name):
+                            yield member, tf.extractfile(info).read()
+                        else:
+                            yield member, None
+        else:
+            with open(path, "rb") as fh:
+                yield name, fh.read()
+
+
+def _decode(data: bytes):
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def analyze_batch(spooled: List[Tuple[str, str]], detect_batch: Callable[[List[np.ndarray]], list],
+                  emit: Callable[[dict], None], batch_size: int = 8,
+                  decode_workers: int = 4, include_images: bool = False,
+                  cancelled: threading.Event = None) -> dict:
+    """
+    Decode images concurrently and run inference in micro-batches.
+
+    At most 2 * batch_size images are decoded ahead of inference, so memory
+    stays bounded regardless of how many images the batch contains. Results
+    are passed to emit() in input order as soon as their micro-batch is done.
+
+    Args:
+        spooled: (filename, path) pairs from spool_uploads() (images or zip/tar archives)
+        detect_batch: Function mapping a list of frames to (count, emergency, image) tuples
+        emit: Called with one result record per image
+        batch_size: Frames per inference call
+        decode_workers: Concurrent image decoders
+        include_images: Include the annotated JPEG (base64) in each record
+        cancelled: Set to stop early (e.g. the client disconnected)
+
+    Returns:
+        Summary with totals
+    """
+    summary = {"images": 0, "errors": 0, "vehicles": 0, "emergencies": 0}
+    pending = deque()       # (index, name, future or None) in input order
+    batch = []              # (index, name, frame) awaiting inference
+
+    def flush():
+        if not batch:
+            return
+        results = detect_batch([frame for _, _, frame in batch])
+        for (index, name, _), (count, emergency, image) in zip(batch, results):
+            record = {"index": index, "name": name, "count": count, "emergency": emergency}
+            if include_images:
+                record["image"] = image
+            summary["images"] += 1
+            summary["vehicles"] += count
+            summary["emergencies"] += int(emergency)
+            emit(record)
+        batch.clear()
+
+    def drain(limit: int):
+        # Move decoded frames (in order) into the inference batch
+        while len(pending) > limit:
+            index, name, future = pending.popleft()
+            frame = future.result() if future is not None else None
+            if frame is None:
+                flush()         # keep records in input order
+                summary["errors"] += 1
+                emit({"index": index, "name": name,
+                      "error": "not an image" if future is None else "invalid image format"})
+                continue
+            batch.append((index, name, frame))
+            if len(batch) >= batch_size:
+                flush()
+
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="batch-decode") as pool:
+        for index, (name, data) in enumerate(iter_images(spooled)):
+            if cancelled is not None and cancelled.is_set():
+                break
+            pending.append((index, name, pool.submit(_decode, data) if data is not None else None))
+            drain(2 * batch_size)
+
+        if cancelled is None or not cancelled.is_set():
+            drain(0)
+            flush()
+
+    logger.info(f"Batch analysis finished: {summary}")
+    return summary
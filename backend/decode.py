@@ -0,0 +1,196 @@
+# backend/decode.py
+
+import logging
+from typing import Optional, Tuple
+
+import cv2
+
+try:
+    import av
+except ImportError:             # Listed in requirements; fall back to OpenCV decoding without it
+    av = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("decode")
+
+DETECTOR_SIDE = 640             # Longest side the detector letter-boxes frames to
+STREAM_TIMEOUT = 5.0            # Seconds a live stream may stall before reads fail
+
+
+def target_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Scale (width, height) so the longest side is at most max_side, keeping dims even."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    r = max_side / max(width, height)
+    return max(2, int(width * r) // 2 * 2), max(2, int(height * r) // 2 * 2)
+
+
+class PyAVCapture:
+    """
+    cv2.VideoCapture-compatible reader backed by PyAV.
+
+    Scaling and BGR conversion happen in one libswscale pass directly on the
+    decoded YUV picture, and the codec decodes with its own thread pool, so
+    full resolution BGR frames are never materialized. Software H.264/HEVC
+    decoding itself still runs at full resolution and dominates the cost.
+    """
+
+    def __init__(self, src: str, max_side: int = DETECTOR_SIDE, threads: int = 2,
+                 options: Optional[dict] = None, timeout: Optional[float] = None):
+        self.src = src
+        self.container = None
+        self.stream = None
+        self._frames = None
+        try:
+            # timeout bounds both opening and every read, so a stalled stream
+            # raises instead of blocking the reader thread forever
+            self.container = av.open(src, options=options or {},
+                                     timeout=(timeout, timeout) if timeout else None)
+            self.stream = self.container.streams.video[0]
+            self.stream.thread_type = "AUTO"
+            self.stream.codec_context.thread_count = threads
+        except Exception as e:
+            logger.error(f"PyAV cannot open {src}: {e}")
+            self.release()
+            return
+
+        ctx = self.stream.codec_context
+        self.width, self.height = target_size(ctx.width, ctx.height, max_side)
+        self._frames = self.container.decode(self.stream)
+
+    def isOpened(self) -> bool:
+        return self.container is not None
+
+    def read(self):
+        if self._frames is None:
+            return False, None
+        try:
+            frame = next(self._frames)
+        except (StopIteration, av.error.EOFError):
+            return False, None
+        except Exception as e:
+            logger.warning(f"Decode error on {self.src}: {e}")
+            return False, None
+        return True, frame.to_ndarray(format="bgr24", width=self.width, height=self.height)
+
+    def grab(self) -> bool:
+        """Decode the next frame without converting it."""
+        if self._frames is None:
+            return False
+        try:
+            next(self._frames)
+        except Exception:
+            return False
+        return True
+
+    def set(self, prop, value) -> bool:
+        if prop == cv2.CAP_PROP_POS_FRAMES and value == 0 and self.container is not None:
+            self.container.seek(0)
+            self._frames = self.container.decode(self.stream)
+            return True
+        return False
+
+    def get(self, prop) -> float:
+        if self.stream is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.stream.frames or 0)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return 0.0
+
+    def release(self) -> None:
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+        self._frames = None
+
+
+class ScaledCapture:
+    """
+    OpenCV fallback used when PyAV is not installed.
+
+    OpenCV always converts the full-resolution picture to BGR, so this path
+    costs slightly more decode CPU than a plain cv2.VideoCapture; it only
+    saves memory and work downstream by keeping reduced-resolution frames.
+    Hardware decoding is requested where the OpenCV build supports it.
+    """
+
+    def __init__(self, src: str, max_side: int = DETECTOR_SIDE, threads: int = 2,
+                 timeout: Optional[float] = None):
+        self.src = src
+        self.max_side = max_side
+        params = []
+        if hasattr(cv2, "CAP_PROP_N_THREADS"):
+            params += [cv2.CAP_PROP_N_THREADS, threads]
+        if hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if timeout and hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+            params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000),
+                       cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout * 1000)]
+        self.cap = cv2.VideoCapture(src, cv2.CAP_FFMPEG, params)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = cv2.VideoCapture(src)        # Let OpenCV pick another backend
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self):
+        ok, f = self.cap.read()
+        if ok and self.max_side:
+            h, w = f.shape[:2]
+            nw, nh = target_size(w, h, self.max_side)
+            if (nw, nh) != (w, h):
+                # Bilinear is plenty for the detector's own letterbox resize and much cheaper than INTER_AREA
+                f = cv2.resize(f, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        return ok, f
+
+    def grab(self) -> bool:
+        return self.cap.grab()
+
+    def set(self, prop, value) -> bool:
+        return self.cap.set(prop, value)
+
+    def get(self, prop) -> float:
+        return self.cap.get(prop)
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+def open_capture(src: str, max_side: int = DETECTOR_SIDE, threads: int = 2,
+                 live: bool = False, timeout: float = STREAM_TIMEOUT):
+    """
+    Open a reduced-resolution capture for a file or stream.
+
+    Args:
+        src: File path or stream URL
+        max_side: Longest side of the decoded frames (0 keeps full resolution)
+        threads: Decoder threads for this stream
+        live: Apply low-latency demuxer options and I/O timeouts for network streams
+        timeout: Seconds a live stream may stall before open/read fails
+
+    Returns:
+        A capture object with the cv2.VideoCapture read/set/get/release API
+    """
+    timeout = timeout if live else None
+    if av is not None:
+        options = None
+        if live:
+            # Socket-level timeouts (microseconds) in addition to PyAV's own
+            us = str(int(timeout * 1e6))
+            options = {"rtsp_transport": "tcp", "fflags": "nobuffer", "flags": "low_delay",
+                       "timeout": us, "rw_timeout": us}
+        cap = PyAVCapture(src, max_side, threads, options, timeout)
+        if cap.isOpened():
+            return cap
+    return ScaledCapture(src, max_side, threads, timeout)
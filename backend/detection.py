@@ -1,6 +1,5 @@
-import cv2, numpy as np, time, base64, os, logging
+import cv2, numpy as np, time, base64, os, logging, threading, itertools
 from pathlib import Path
-from ultralytics import YOLO
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,24 +18,74 @@ class TrafficDetector:
         self.conf_threshold = conf_threshold
         self.iou_threshold  = iou_threshold
         self.frame_skip     = frame_skip
-        self.frame_counter  = 0
+        self.frame_counter  = itertools.count(1)                # next() is atomic across threads
         self.max_count_limit = max_count_limit
         self.verbose        = verbose
 
         self.vehicles   = {"car", "bus", "motorcycle", "truck", "bicycle"}
         self.emergency_vehicles = {"ambulance", "fire engine", "police car"}
 
-        model_path = Path("yolo/yolov8n.pt")
-        os.makedirs("yolo", exist_ok=True)
-        os.makedirs("debug_images", exist_ok=True)
-
-        self.model  = YOLO(str(model_path))
-        self.model.conf = self.conf_threshold
-        self.model.iou  = self.iou_threshold
-        self.stride = int(max(self.model.stride))                # model stride
+        self.model_path = Path("yolo/yolov8n.pt")
         self.imgsz  = (640, 640)                                 # force 640×640
 
-        self._warmup()
+        # the model is loaded lazily (or in the background via load_async)
+        self.model      = None
+        self.state      = "idle"                                 # idle | loading | ready | error
+        self.load_error = None
+        self.load_time  = None
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()                      # model calls are not thread-safe
+
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        """Load YOLO and warm it up; safe to call repeatedly from any thread."""
+        with self._load_lock:
+            if self.state == "ready":
+                return
+            self.state = "loading"
+            t0 = time.time()
+            try:
+                from ultralytics import YOLO                     # heavy import (torch)
+
+                os.makedirs("yolo", exist_ok=True)
+                os.makedirs("debug_images", exist_ok=True)
+
+                model = YOLO(str(self.model_path))
+                model.conf = self.conf_threshold
+                model.iou  = self.iou_threshold
+                self.stride = int(max(model.stride))             # model stride
+                self.names  = model.names
+                self.model = model
+
+                self._warmup()
+            except Exception as e:
+                self.model = None
+                self.state = "error"
+                self.load_error = str(e)
+                logger.error(f"Model load failed: {e}")
+                raise
+
+            self.load_time = time.time() - t0
+            self.state = "ready"
+            logger.info(f"Detector ready in {self.load_time:.2f}s")
+
+    def load_async(self):
+        """Start loading the model on a background thread."""
+        def run():
+            try:
+                self.load()
+            except Exception:
+                pass                                             # reported via state / load_error
+
+        threading.Thread(target=run, name="detector-load", daemon=True).start()
+
+    def status(self) -> dict:
+        return {"state": self.state, "error": self.load_error, "load_time": self.load_time}
 
     # ─────────────────────────────────────────────────────────────────────────
 
@@ -64,90 +113,84 @@ class TrafficDetector:
         l = cv2.equalizeHist(l)
         return cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2BGR)
 
+    # raw inference: Nx6 float32 [x1, y1, x2, y2, conf, cls] in frame coords --
+    def infer(self, frame: np.ndarray) -> np.ndarray:
+        return self.infer_batch([frame])[0]
+
+    # one model call for several frames (micro-batch) -------------------------
+    def infer_batch(self, frames: list) -> list:
+        if not self.ready:
+            self.load()
+
+        preps = [self._resize_pad(self.preprocess(f)) for f in frames]
+
+        with self._infer_lock:
+            results = self.model([blob for blob, _, _, _ in preps], imgsz=self.imgsz, verbose=False)
+
+        out = []
+        for res, (_, r, offx, offy) in zip(results, preps):
+            dets = np.concatenate([res.boxes.xyxy.cpu().numpy(),
+                                   res.boxes.conf.cpu().numpy()[:, None],
+                                   res.boxes.cls.cpu().numpy()[:, None]], axis=1).astype(np.float32)
+            dets = dets[dets[:, 4] >= self.conf_threshold]       # extra guard
+            # undo padding‑scale
+            dets[:, [0, 2]] = (dets[:, [0, 2]] - offx) / r
+            dets[:, [1, 3]] = (dets[:, [1, 3]] - offy) / r
+            out.append(dets)
+        return out
+
+    # count, flag emergencies and draw boxes ----------------------------------
+    def render(self, frame: np.ndarray, dets: np.ndarray):
+        draw = frame.copy()
+        count, emergency = self.draw(draw, dets)
+
+        _, jpg = cv2.imencode(".jpg", draw, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+        return count, emergency, base64.b64encode(jpg).decode()
+
+    # draw boxes in place, return (count, emergency) --------------------------
+    def draw(self, draw: np.ndarray, dets: np.ndarray):
+        count, emergency = 0, False
+        for x1, y1, x2, y2, conf, cls in dets:
+            cls_name = self.names[int(cls)].lower()
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+
+            if cls_name in self.vehicles:
+                count += 1
+            if cls_name in self.emergency_vehicles:
+                emergency = True
+                count += 1
+
+            colour = (0, 0, 255) if cls_name in self.emergency_vehicles else (0, 255, 0)
+            cv2.rectangle(draw, (x1, y1), (x2, y2), colour, 2)
+            cv2.putText(draw, f"{cls_name} {conf:.2f}", (x1, y1 - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1)
+
+        return min(count, self.max_count_limit), emergency
+
+    def config_id(self, frame_shape) -> str:
+        """Identity of everything besides the frame that affects detections."""
+        return f"{self.model_path.name}|{self.conf_threshold}|{self.iou_threshold}|{self.imgsz}|{tuple(frame_shape)}"
+
     # main public API ---------------------------------------------------------
-    def detect_objects(self, frame: np.ndarray):
-        try:
-            if frame is None:
-                return 0, False, ""
-
-            self.frame_counter += 1
-            if self.frame_skip and self.frame_counter % (self.frame_skip + 1):
-                _, jpg = cv2.imencode(".jpg", frame)
-                return 0, False, base64.b64encode(jpg).decode()
-
-            draw = frame.copy()
-            proc = self.preprocess(frame)
-            blob, r, offx, offy = self._resize_pad(proc)
-
-            res = self.model(blob, imgsz=self.imgsz, verbose=False)[0]
-
-            count, emergency = 0, False
-            for box, conf, cls in zip(res.boxes.xyxy.cpu().numpy(),
-                                      res.boxes.conf.cpu().numpy(),
-                                      res.boxes.cls.cpu().numpy()):
-
-                if conf < self.conf_threshold:       # extra guard
-                    continue
-
-                cls_name = res.names[int(cls)].lower()
-                x1, y1, x2, y2 = box
-                # undo padding‑scale
-                x1 = int((x1 - offx) / r);  x2 = int((x2 - offx) / r)
-                y1 = int((y1 - offy) / r);  y2 = int((y2 - offy) / r)
-
-                if cls_name in self.vehicles:
-                    count += 1
-                if cls_name in self.emergency_vehicles:
-                    emergency = True
-                    count += 1
-
-                colour = (0, 0, 255) if cls_name in self.emergency_vehicles else (0, 255, 0)
-                cv2.rectangle(draw, (x1, y1), (x2, y2), colour, 2)
-                cv2.putText(draw, f"{cls_name} {conf:.2f}", (x1, y1 - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1)
-
-            count = min(count, self.max_count_limit)
-
-            _, jpg = cv2.imencode(".jpg", draw, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            return count, emergency, base64.b64encode(jpg).decode()
-
-        except Exception as e:
-            logger.error(f"Detection error: {e}")
+    def detect_objects(self, frame: np.ndarray, cache_key=None):
+        """
+        Detect vehicles in a frame.
+
+        Goes through the shared inference service like every other caller
+        (or runs inline when the service is not running, e.g. in scripts);
+        cache_key is (source_id, frame_index) for frames from looping file
+        sources, whose detections are memoized.
+        """
+        from inference import inference_service, UPLOAD         # inference imports this module
+
+        if frame is not None and self.frame_skip and next(self.frame_counter) % (self.frame_skip + 1):
             _, jpg = cv2.imencode(".jpg", frame)
             return 0, False, base64.b64encode(jpg).decode()
+        return inference_service.detect(frame, UPLOAD, cache_key)
 
     def __del__(self):
         logger.info("Releasing detector resources")
 
 
-# singleton instance exposed exactly like before
+# singleton instance exposed exactly like before (model loads on first use)
 detector = TrafficDetector(verbose=False)
-
-def sample_cycle(sources: dict) -> dict:
-    latest, caps, start = {l: None for l in sources}, {}, time.time()
-    try:
-        for lane, src in sources.items():
-            cap = cv2.VideoCapture(src)
-            if cap.isOpened():
-                caps[lane] = cap
-
-        while time.time() - start < 1.0:
-            for lane, cap in caps.items():
-                ok, f = cap.read()
-                if not ok:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    ok, f = cap.read()
-                if ok:
-                    latest[lane] = f
-
-        res = {}
-        for lane, f in latest.items():
-            if f is not None:
-                c, e, img = detector.detect_objects(f)
-                res[lane] = {"count": c, "emergency": e, "image": img}
-            else:
-                res[lane] = {"count": 0, "emergency": False, "image": ""}
-        return res
-    finally:
-        for cap in caps.values():
-            cap.release()
@@ -0,0 +1,148 @@
+# backend/detection_cache.py
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("detection_cache")
+
+# (source_id, frame_index, detector config id)
+CacheKey = Tuple[str, int, str]
+
+
+def file_identity(path: str) -> Optional[str]:
+    """Stable identity of a file's contents: real path, size and mtime."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class DetectionCache:
+    """
+    Memoizes raw detections for frames of looping file sources.
+
+    Entries are Nx6 float32 arrays ([x1, y1, x2, y2, conf, cls]) keyed by
+    (source identity, frame index, detector config). Memory is bounded by
+    LRU eviction; the cache can be persisted as one compact .npz per
+    (source, config) so looped clips stay cheap across restarts.
+    """
+
+    def __init__(self, max_entries: int = 50000, persist_dir: Optional[str] = "app_data/detection_cache"):
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.entries = OrderedDict()        # CacheKey -> detections, oldest first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        logger.info("DetectionCache initialized")
+
+    def get(self, key: CacheKey) -> Optional[np.ndarray]:
+        with self.lock:
+            dets = self.entries.get(key)
+            if dets is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dets
+
+    def put(self, key: CacheKey, dets: np.ndarray) -> None:
+        with self.lock:
+            self.entries[key] = dets
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def save(self) -> int:
+        """
+        Persist the cache, one .npz per (source, config).
+
+        Returns:
+            Number of files written
+        """
+        if not self.persist_dir:
+            return 0
+        os.makedirs(self.persist_dir, exist_ok=True)
+
+        with self.lock:
+            groups = {}
+            for (source_id, idx, config_id), dets in self.entries.items():
+                groups.setdefault((source_id, config_id), []).append((idx, dets))
+
+        for (source_id, config_id), items in groups.items():
+            items.sort(key=lambda item: item[0])
+            lengths = [len(dets) for _, dets in items]
+            name = hashlib.sha1(f"{source_id}|{config_id}".encode()).hexdigest()[:16]
+            np.savez_compressed(
+                os.path.join(self.persist_dir, f"{name}.npz"),
+                source_id=np.array(source_id),
+                config_id=np.array(config_id),
+                frames=np.array([idx for idx, _ in items], dtype=np.int32),
+                offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32),
+                dets=np.concatenate([dets for _, dets in items]).astype(np.float32)
+                if items else np.zeros((0, 6), np.float32),
+            )
+
+        logger.info(f"Saved {len(self.entries)} cached detections to {len(groups)} files")
+        return len(groups)
+
+    def load(self) -> int:
+        """
+        Load persisted entries, skipping files whose source has since changed.
+
+        Returns:
+            Number of entries loaded
+        """
+        if not self.persist_dir or not os.path.isdir(self.persist_dir):
+            return 0
+
+        loaded = 0
+        for fname in os.listdir(self.persist_dir):
+            if not fname.endswith(".npz"):
+                continue
+            try:
+                with np.load(os.path.join(self.persist_dir, fname)) as data:
+                    source_id, config_id = str(data["source_id"]), str(data["config_id"])
+                    path = source_id.rsplit(":", 2)[0]
+                    if file_identity(path) != source_id:
+                        continue        # file was modified or removed
+                    frames, offsets, dets = data["frames"], data["offsets"], data["dets"]
+                    for i, idx in enumerate(frames):
+                        self.put((source_id, int(idx), config_id), dets[offsets[i]:offsets[i + 1]])
+                        loaded += 1
+            except Exception as e:
+                logger.warning(f"Skipping unreadable cache file {fname}: {e}")
+
+        logger.info(f"Loaded {loaded} cached detections")
+        return loaded
+
+    def get_metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+# Create cache instance for export
+detection_cache = DetectionCache()
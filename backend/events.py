@@ -0,0 +1,108 @@
+# backend/events.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("events")
+
+
+class EventBus:
+    """
+    In-process fan-out of low-latency events to async subscribers.
+
+    Each subscriber gets its own bounded queue; a slow subscriber loses its
+    oldest events rather than holding up anyone else. publish() runs on the
+    event loop; worker threads hand their results over with
+    loop.call_soon_threadsafe(). Coroutines that only need to wake up on new
+    events use wait() instead of subscribing.
+    """
+
+    def __init__(self, queue_size: int = 100, history: int = 20):
+        self.subscribers = set()
+        self.queue_size = queue_size
+        self.recent = deque(maxlen=history)        # Last events, for late joiners / other workers
+        self.seq = 0
+        self._published = asyncio.Event()          # Replaced on every publish; wakes wait()
+
+        # Latency samples in seconds
+        self.publish_latency = deque(maxlen=500)   # detection -> publish
+        self.delivery_latency = deque(maxlen=500)  # detection -> written to a client
+
+        logger.info("EventBus initialized")
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    async def wait(self, timeout: float) -> bool:
+        """Sleep up to timeout; return True early if an event is published."""
+        published = self._published
+        try:
+            await asyncio.wait_for(published.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def publish(self, event: dict) -> dict:
+        """Deliver an event to every subscriber (event loop thread only)."""
+        if "seq" not in event:
+            self.seq += 1
+            event["seq"] = self.seq
+        else:
+            self.seq = max(self.seq, event["seq"])
+        event.setdefault("published_at", time.time())
+        if "detected_at" in event:
+            self.publish_latency.append(event["published_at"] - event["detected_at"])
+        self.recent.append(event)
+
+        for queue in list(self.subscribers):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+        self._published.set()
+        self._published = asyncio.Event()
+        return event
+
+    def record_delivery(self, event: dict) -> None:
+        if "detected_at" in event:
+            self.delivery_latency.append(time.time() - event["detected_at"])
+
+    @staticmethod
+    def _summary(samples) -> dict:
+        values = sorted(samples)
+        if not values:
+            return {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        pick = lambda pct: values[min(len(values) - 1, int(pct * (len(values) - 1)))]
+        return {
+            "count": len(values),
+            "p50_ms": round(1000 * pick(0.5), 2),
+            "p95_ms": round(1000 * pick(0.95), 2),
+            "max_ms": round(1000 * values[-1], 2),
+        }
+
+    def get_metrics(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "events_published": self.seq,
+            "detection_to_publish": self._summary(self.publish_latency),
+            "detection_to_delivery": self._summary(self.delivery_latency),
+        }
+
+
+# Emergency preemption channel
+emergency_bus = EventBus()
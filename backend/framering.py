@@ -0,0 +1,207 @@
+# backend/framering.py
+
+import logging
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from decode import DETECTOR_SIDE
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("framering")
+
+# Per-slot header fields (int64): generation counter, frame height, width, capture time (ns)
+_GEN, _H, _W, _TS = range(4)
+_SLOT_FIELDS = 4
+
+
+class FrameRing:
+    """
+    Shared-memory ring of fixed-size frame slots, one ring per lane.
+
+    A single writer per lane (the capture process) copies decoded frames into
+    the next slot; readers in other processes get NumPy views straight into
+    shared memory, so frames move from decoder to detector without pickling.
+
+    Each slot carries a seqlock-style generation counter: it is odd while the
+    writer is filling the slot and even once the frame is complete. A reader
+    records the generation when taking a view and checks it again after use
+    (see is_current / consume); a changed generation means the writer lapped
+    the ring and the result must be discarded. With N slots the writer has to
+    write N more frames to that lane before a view can be overwritten.
+
+    Layout:
+        header: int64[lanes, 1 + slots * 4]  (write count, then per-slot fields)
+        frames: uint8[lanes, slots, max_h, max_w, 3]
+    """
+
+    def __init__(self, lanes: List[str], slots: int = 4,
+                 max_shape: Tuple[int, int] = (DETECTOR_SIDE, DETECTOR_SIDE),
+                 name: Optional[str] = None, create: bool = True):
+        self.lanes = list(lanes)
+        self.index = {lane: i for i, lane in enumerate(self.lanes)}
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+
+        header_shape = (len(self.lanes), 1 + slots * _SLOT_FIELDS)
+        frames_shape = (len(self.lanes), slots, self.max_shape[0], self.max_shape[1], 3)
+        header_bytes = int(np.prod(header_shape)) * 8
+        size = header_bytes + int(np.prod(frames_shape))
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.owner = create
+        self.header = np.ndarray(header_shape, dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self.header[:] = 0
+
+        logger.info(f"FrameRing {'created' if create else 'attached'}: {self.shm.name} "
+                    f"({len(self.lanes)} lanes x {slots} slots, {size / 2 ** 20:.1f} MB)")
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def attach(cls, name: str, lanes: List[str], slots: int = 4,
+               max_shape: Tuple[int, int] = (DETECTOR_SIDE, DETECTOR_SIDE)) -> "FrameRing":
+        """Attach to a ring created by another process (same lanes/slots/shape)."""
+        return cls(lanes, slots, max_shape, name=name, create=False)
+
+    def _field(self, lane_idx: int, slot: int, field: int) -> int:
+        return 1 + slot * _SLOT_FIELDS + field
+
+    def write(self, lane: str, frame: np.ndarray) -> int:
+        """
+        Copy a BGR frame into the lane's next slot (single writer per lane).
+
+        Returns:
+            The lane's write count after this frame
+        """
+        i = self.index[lane]
+        h, w = frame.shape[:2]
+        if h > self.max_shape[0] or w > self.max_shape[1]:
+            raise ValueError(f"Frame {w}x{h} exceeds ring slot {self.max_shape[1]}x{self.max_shape[0]}")
+
+        n = int(self.header[i, 0])
+        slot = n % self.slots
+        gen = self._field(i, slot, _GEN)
+
+        self.header[i, gen] += 1                                    # odd: write in progress
+        self.frames[i, slot, :h, :w] = frame
+        self.header[i, self._field(i, slot, _H)] = h
+        self.header[i, self._field(i, slot, _W)] = w
+        self.header[i, self._field(i, slot, _TS)] = time.time_ns()
+        self.header[i, gen] += 1                                    # even: frame complete
+        self.header[i, 0] = n + 1                                   # publish
+        return n + 1
+
+    def read_latest(self, lane: str, retries: int = 3):
+        """
+        Get a zero-copy view of the lane's newest complete frame.
+
+        Returns:
+            (token, view, captured_at) or (None, None, None) if nothing is
+            available. Pass the token to is_current() after using the view.
+        """
+        i = self.index[lane]
+        for _ in range(retries):
+            n = int(self.header[i, 0])
+            if n == 0:
+                return None, None, None
+            slot = (n - 1) % self.slots
+            g = int(self.header[i, self._field(i, slot, _GEN)])
+            if g % 2:
+                continue                                            # writer lapped us mid-read
+            h = int(self.header[i, self._field(i, slot, _H)])
+            w = int(self.header[i, self._field(i, slot, _W)])
+            ts = int(self.header[i, self._field(i, slot, _TS)]) / 1e9
+            view = self.frames[i, slot, :h, :w]
+            if int(self.header[i, self._field(i, slot, _GEN)]) == g:
+                return (i, slot, g), view, ts
+        return None, None, None
+
+    def is_current(self, token) -> bool:
+        """True if the slot behind a view has not been rewritten since it was read."""
+        i, slot, g = token
+        return int(self.header[i, self._field(i, slot, _GEN)]) == g
+
+    def consume(self, lane: str, fn: Callable[[np.ndarray], object], retries: int = 3):
+        """
+        Apply fn to the newest frame in place and validate it afterwards.
+
+        fn must finish reading the view before returning (TrafficDetector
+        copies/preprocesses the frame first thing, so it qualifies).
+
+        Returns:
+            fn's result, or None if no consistent frame could be processed
+        """
+        for _ in range(retries):
+            token, view, _ = self.read_latest(lane)
+            if token is None:
+                return None
+            result = fn(view)
+            if self.is_current(token):
+                return result
+            logger.debug(f"Frame for {lane} overwritten during processing, retrying")
+        return None
+
+    def write_counts(self) -> Dict[str, int]:
+        return {lane: int(self.header[i, 0]) for lane, i in self.index.items()}
+
+    def close(self) -> None:
+        # Drop our views before closing the mapping
+        self.header = None
+        self.frames = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """Remove the segment (creator only, after every process closed it)."""
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_worker(ring_name: str, sources: Dict[str, str], slots: int = 4,
+                   max_shape: Tuple[int, int] = (DETECTOR_SIDE, DETECTOR_SIDE),
+                   stop_event=None, fps: float = 15.0) -> None:
+    """
+    Process entry point: decode every lane and publish frames into the ring.
+
+    Args:
+        ring_name: Name of a ring created by the parent process
+        sources: Lane -> source mapping (lane order must match the ring)
+        slots, max_shape: Ring geometry used at creation
+        stop_event: multiprocessing.Event that ends the loop
+        fps: Upper bound on frames published per lane per second
+    """
+    from sources import make_reader
+
+    ring = FrameRing.attach(ring_name, list(sources), slots, max_shape)
+    readers = {}
+    for lane, src in sources.items():
+        reader = make_reader(src, max_side=max(max_shape))
+        try:
+            reader.open()
+            readers[lane] = reader
+        except Exception as e:
+            logger.error(f"Capture worker cannot open {lane}: {e}")
+
+    interval = 1.0 / fps
+    try:
+        while stop_event is None or not stop_event.is_set():
+            start = time.time()
+            for lane, reader in readers.items():
+                ok, f = reader.read()
+                if ok:
+                    ring.write(lane, f)
+            time.sleep(max(0.0, interval - (time.time() - start)))
+    finally:
+        for reader in readers.values():
+            reader.release()
+        ring.close()
@@ -0,0 +1,359 @@
+# backend/inference.py
+
+import asyncio
+import base64
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, as_completed
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from detection import detector as default_detector
+from detection_cache import detection_cache
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("inference")
+
+# Priority classes, most urgent first
+LIVE, EMERGENCY, UPLOAD, HEALTH = range(4)
+PRIORITY_NAMES = {LIVE: "live", EMERGENCY: "emergency", UPLOAD: "upload", HEALTH: "health"}
+
+
+class InferenceService:
+    """
+    Single gateway to the detection model.
+
+    Every caller (live poll loop, emergency re-checks, uploads, health
+    checks) submits frames to one priority queue. A dedicated worker thread
+    pops the most urgent requests, waits up to batch_window for more to
+    arrive, and runs them as one micro-batch, so no caller touches the
+    model concurrently and a large upload cannot starve the signal loop.
+    Callers get raw detections back and render them on their own thread.
+    A caller may cancel() a future that is still queued; it is then skipped.
+    submit() refuses work while the worker is not running, and the blocking
+    helpers give up after result_timeout instead of waiting forever.
+    """
+
+    def __init__(self, detector=default_detector, max_batch: int = 8, batch_window: float = 0.005,
+                 result_timeout: float = 30.0):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.batch_window = batch_window        # Seconds to wait for more requests to coalesce
+        self.result_timeout = result_timeout    # Seconds a blocking caller waits for its detections
+
+        self.queue = []                          # heap of (priority, seq, enqueued_at, frame, future)
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Metrics
+        self.wait_times = {p: deque(maxlen=500) for p in PRIORITY_NAMES}
+        self.requests = {p: 0 for p in PRIORITY_NAMES}
+        self.batch_sizes = deque(maxlen=500)
+        self.batch_times = deque(maxlen=500)
+
+        logger.info("InferenceService initialized")
+
+    # ── lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="inference", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+
+    # ── submission ───────────────────────────────────────────────────────────
+
+    def submit(self, frame: np.ndarray, priority: int = UPLOAD) -> Future:
+        """Queue a frame; the future resolves to its raw Nx6 detections."""
+        future = Future()
+        with self.cond:
+            if not self.running:
+                raise RuntimeError("Inference service is not running")
+            heapq.heappush(self.queue, (priority, next(self.counter), time.time(), frame, future))
+            self.requests[priority] += 1
+            self.cond.notify()
+        return future
+
+    def _cache_key(self, frame: np.ndarray, cache_key):
+        if cache_key is None:
+            return None
+        return cache_key[0], cache_key[1], self.detector.config_id(frame.shape)
+
+    def _result(self, future: Future):
+        """Wait for a submitted frame's detections, dropping it from the queue on timeout."""
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"No detections within {self.result_timeout:g}s")
+
+    def detect(self, frame: np.ndarray, priority: int = UPLOAD, cache_key=None):
+        """
+        Blocking detection of one frame through the queue.
+
+        Runs the model inline when the service is not running (scripts,
+        or after shutdown), so it never waits on a queue nobody serves.
+        """
+        if frame is None:
+            return 0, False, ""
+        try:
+            key = self._cache_key(frame, cache_key)
+            dets = detection_cache.get(key) if key is not None else None
+            if dets is None:
+                if self.running:
+                    dets = self._result(self.submit(frame, priority))
+                else:
+                    dets = self.detector.infer_batch([frame])[0]
+                if key is not None:
+                    detection_cache.put(key, dets)
+            return self.detector.render(frame, dets)
+        except Exception as e:
+            logger.error(f"Detection error: {e}")
+            return self._fallback(frame)
+
+    async def detect_async(self, frame: np.ndarray, priority: int = UPLOAD):
+        """Awaitable detect() that never blocks the event loop."""
+        if frame is None:
+            return 0, False, ""
+        try:
+            future = self.submit(frame, priority)
+            try:
+                dets = await asyncio.wait_for(asyncio.wrap_future(future), self.result_timeout)
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise TimeoutError(f"No detections within {self.result_timeout:g}s")
+            return await asyncio.to_thread(self.detector.render, frame, dets)
+        except Exception as e:
+            logger.error(f"Detection error: {e}")
+            return self._fallback(frame)
+
+    def detect_many(self, frames: List[np.ndarray], priority: int = UPLOAD) -> list:
+        """Submit several frames at once (they coalesce into micro-batches)."""
+        futures = [self.submit(f, priority) for f in frames]
+        results = []
+        for frame, future in zip(frames, futures):
+            try:
+                results.append(self.detector.render(frame, self._result(future)))
+            except Exception as e:
+                logger.error(f"Detection error: {e}")
+                results.append(self._fallback(frame))
+        return results
+
+    def detect_frames(self, frames: Dict[str, Optional[np.ndarray]], keys: dict = None,
+                      priorities: dict = None, on_result: Callable = None) -> dict:
+        """
+        Lane-level detection for the poll loop.
+
+        All lanes are submitted together so they share micro-batches, and
+        on_result(lane, result) fires as each lane's detection completes (not
+        for lanes without a frame or whose detection failed).
+
+        Args:
+            frames: Lane -> frame (None if unavailable)
+            keys: Lane -> (source_id, frame_index) cache key for file sources
+            priorities: Lane -> priority class (defaults to LIVE)
+            on_result: Optional per-lane completion callback
+        """
+        keys, priorities = keys or {}, priorities or {}
+        res, pending = {}, {}
+
+        def finish(lane, frame, dets):
+            try:
+                c, e, img = self.detector.render(frame, dets) if dets is not None else self._fallback(frame)
+            except Exception as ex:
+                logger.error(f"Detection error: {ex}")
+                c, e, img, dets = *self._fallback(frame), None
+            res[lane] = {"count": c, "emergency": e, "image": img}
+            # Failed detections are placeholders, not results
+            if on_result is not None and dets is not None:
+                on_result(lane, res[lane])
+
+        for lane, frame in frames.items():
+            if frame is None:
+                # Nothing was observed - not a negative sample for on_result
+                res[lane] = {"count": 0, "emergency": False, "image": ""}
+                continue
+            key = self._cache_key(frame, keys.get(lane))
+            dets = detection_cache.get(key) if key is not None else None
+            if dets is not None:
+                finish(lane, frame, dets)
+            else:
+                future = self.submit(frame, priorities.get(lane, LIVE))
+                pending[future] = (lane, frame, key)
+
+        for future in as_completed(pending):
+            lane, frame, key = pending[future]
+            try:
+                dets = future.result()
+                if key is not None:
+                    detection_cache.put(key, dets)
+            except Exception as e:
+                logger.error(f"Detection error for {lane}: {e}")
+                dets = None
+            finish(lane, frame, dets)
+
+        # Preserve the input lane order
+        return {lane: res[lane] for lane in frames}
+
+    def detect_ring(self, ring, lanes: List[str], priority: int = LIVE, retries: int = 3) -> dict:
+        """
+        Lane-level detection on zero-copy views into a FrameRing.
+
+        The views go through the queue as-is, so frames reach the model
+        straight from shared memory. Each result is kept only if the slot was
+        not rewritten while in flight; otherwise the lane is resubmitted with
+        its newest frame (up to retries times).
+        """
+        res = {lane: {"count": 0, "emergency": False, "image": ""} for lane in lanes}
+        attempts = {lane: 0 for lane in lanes}
+        pending = {}
+
+        def submit(lane):
+            token, view, _ = ring.read_latest(lane)
+            if token is not None:
+                attempts[lane] += 1
+                pending[self.submit(view, priority)] = (lane, token, view)
+
+        for lane in lanes:
+            submit(lane)
+
+        while pending:
+            future = next(as_completed(list(pending)))
+            lane, token, view = pending.pop(future)
+            try:
+                c, e, img = self.detector.render(view, future.result())
+            except Exception as ex:
+                logger.error(f"Detection error for {lane}: {ex}")
+                continue
+            if ring.is_current(token):
+                res[lane] = {"count": c, "emergency": e, "image": img}
+            elif attempts[lane] < retries:
+                logger.debug(f"Frame for {lane} overwritten during inference, retrying")
+                submit(lane)
+
+        return res
+
+    def probe(self, timeout: float) -> bool:
+        """
+        Health check through the queue at HEALTH priority.
+
+        Returns False if the request was not served within timeout (the
+        queue is saturated with more urgent work); raises on model errors.
+        """
+        future = self.submit(np.zeros((100, 100, 3), dtype=np.uint8), HEALTH)
+        try:
+            future.result(timeout=timeout)
+            return True
+        except FutureTimeoutError:
+            future.cancel()             # don't let starved probes pile up in the queue
+            return False
+
+    @staticmethod
+    def _fallback(frame: np.ndarray):
+        _, jpg = cv2.imencode(".jpg", frame)
+        return 0, False, base64.b64encode(jpg).decode()
+
+    # ── worker ───────────────────────────────────────────────────────────────
+
+    def _next_batch(self) -> list:
+        """Wait for work, then coalesce up to max_batch requests within the window."""
+        with self.cond:
+            while self.running and not self.queue:
+                self.cond.wait()
+            if not self.running:
+                return []
+
+            deadline = time.time() + self.batch_window
+            while len(self.queue) < self.max_batch and self.running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+            batch = []
+            while self.queue and len(batch) < self.max_batch:
+                item = heapq.heappop(self.queue)
+                if item[4].set_running_or_notify_cancel():     # False if the caller cancelled it
+                    batch.append(item)
+            return batch
+
+    def _run(self) -> None:
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            start = time.time()
+            for priority, _, enqueued_at, _, _ in batch:
+                self.wait_times[priority].append(start - enqueued_at)
+
+            frames = [frame for _, _, _, frame, _ in batch]
+            try:
+                results = self.detector.infer_batch(frames)
+                for (_, _, _, _, future), dets in zip(batch, results):
+                    future.set_result(dets)
+            except Exception as e:
+                logger.error(f"Inference batch failed: {e}")
+                for _, _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.batch_sizes.append(len(batch))
+            self.batch_times.append(time.time() - start)
+
+        # Fail anything still queued on shutdown
+        with self.cond:
+            for _, _, _, _, future in self.queue:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(RuntimeError("Inference service stopped"))
+            self.queue.clear()
+
+    # ── metrics ──────────────────────────────────────────────────────────────
+
+    def get_metrics(self) -> dict:
+        def summary(samples):
+            values = sorted(samples)
+            if not values:
+                return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+            pick = lambda pct: values[min(len(values) - 1, int(pct * (len(values) - 1)))]
+            return {"p50_ms": round(1000 * pick(0.5), 2),
+                    "p95_ms": round(1000 * pick(0.95), 2),
+                    "max_ms": round(1000 * values[-1], 2)}
+
+        with self.cond:
+            depth = {PRIORITY_NAMES[p]: 0 for p in PRIORITY_NAMES}
+            for item in self.queue:
+                if not item[4].cancelled():     # skipped by the worker
+                    depth[PRIORITY_NAMES[item[0]]] += 1
+
+        return {
+            "queue_depth": depth,
+            "requests": {PRIORITY_NAMES[p]: n for p, n in self.requests.items()},
+            "queue_wait": {PRIORITY_NAMES[p]: summary(w) for p, w in self.wait_times.items()},
+            "avg_batch_size": round(sum(self.batch_sizes) / len(self.batch_sizes), 2) if self.batch_sizes else None,
+            "avg_batch_ms": round(1000 * sum(self.batch_times) / len(self.batch_times), 2) if self.batch_times else None,
+        }
+
+
+# Create inference service instance for export
+inference_service = InferenceService()
@@ -6,6 +6,8 @@ import logging
 from typing import Dict, Optional, List
 from datetime import datetime
 import traceback
+import threading
+import concurrent.futures
 import tempfile
 import uuid
 
@@ -18,8 +20,16 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
 
-from detection import sample_cycle, detector
+from detection import detector
+from detection_cache import detection_cache
 from optimizer import optimizer
+from scheduler import scheduler
+from sources import source_manager, is_stream
+from shared_state import SharedState
+from events import emergency_bus
+from batch import analyze_batch, spool_uploads, remove_spooled
+from inference import inference_service, LIVE, EMERGENCY, UPLOAD
+from annotate import annotation_jobs
 
 # Configure logging
 logging.basicConfig(
@@ -51,11 +61,14 @@ class TrafficResponse(BaseModel):
     timestamp: str
 
 class MediaAnalysisResponse(BaseModel):
-    count: int
-    emergency: bool
-    image: str
+    # Video results arrive with the render job status instead
+    count: Optional[int] = None
+    emergency: Optional[bool] = None
+    image: Optional[str] = None
     media_type: str
     video_url: Optional[str] = None
+    annotated_video_url: Optional[str] = None
+    render_job_id: Optional[str] = None
 
 # 🛡️ CORS configuration
 app.add_middleware(
@@ -78,37 +91,261 @@ camera_sources = {
 active_clients = set()
 stop_event = asyncio.Event()
 
+# Lanes with an emergency that has already triggered a preemptive re-plan -> time last seen
+active_emergencies = {}
+
+def sample_lanes(lanes: List[str]) -> dict:
+    """Grab the current frame of each lane and run detection (blocking)."""
+    loop = app.state.loop
+
+    def on_result(lane, result):
+        # Emergencies go straight to the event loop instead of waiting for the cycle
+        if result["emergency"] or lane in active_emergencies:
+            loop.call_soon_threadsafe(handle_emergency_result, lane, result, time.time())
+
+    frames = source_manager.grab(lanes)
+    priorities = {lane: EMERGENCY if lane in active_emergencies else LIVE for lane in frames}
+    return inference_service.detect_frames(frames, source_manager.frame_keys, priorities, on_result)
+
+
+def handle_emergency_result(lane: str, result: dict, detected_at: float) -> None:
+    """
+    Emergency fast path: re-plan and notify clients as soon as a lane's
+    detection flags an emergency, without waiting for the poll cadence.
+    The emergency clears only once the lane has gone scheduler.emergency_hold
+    seconds without a sighting, so a single missed detection doesn't end it.
+    """
+    if result["emergency"]:
+        known = lane in active_emergencies
+        active_emergencies[lane] = detected_at
+        if known:
+            return
+
+        # Preemptive re-plan with this lane's fresh result
+        cache = app.state.traffic_cache
+        lanes = dict(cache.get("lanes", {}))
+        lanes[lane] = result
+        timings = optimizer.compute_green_time(lanes, sampled=[lane])
+        app.state.traffic_cache = dict(
+            cache,
+            lanes=lanes,
+            signal_times=timings,
+            timestamp=datetime.now().strftime("%H:%M:%S"),
+            cached_at=time.time(),
+            seq=cache.get("seq", 0) + 1
+        )
+        event = {"type": "emergency", "lane": lane, "count": result["count"],
+                 "signal_times": timings, "detected_at": detected_at}
+    else:
+        if lane not in active_emergencies or detected_at - active_emergencies[lane] < scheduler.emergency_hold:
+            return
+        active_emergencies.pop(lane)
+        event = {"type": "cleared", "lane": lane, "detected_at": detected_at}
+
+    emergency_bus.publish(event)
+    publish_state()
+    logger.info(f"Emergency event published: {event['type']} in {lane}")
+
+
 # Background polling task to prevent heavy CPU usage
 async def traffic_poll_task():
     """Background task that polls traffic data periodically."""
     try:
         while not stop_event.is_set():
-            # Get current data - this is CPU intensive
+            # The model loads in the background - nothing to do until it is ready
+            if not detector.ready:
+                await asyncio.sleep(0.25)
+                continue
+
+            # Only sample the lanes whose refresh deadline has passed
             try:
-                data = sample_cycle(camera_sources)
-                timings = optimizer.compute_green_time(data)
-                
-                # Cache the results
-                cache = {
-                    "lanes": data,
-                    "signal_times": timings,
-                    "timestamp": datetime.now().strftime("%H:%M:%S"),
-                    "cached_at": time.time()
-                }
-                # Store in global variable for access by endpoints
-                app.state.traffic_cache = cache
+                lanes = dict(app.state.traffic_cache.get("lanes", {}))
+                for lane in [l for l in lanes if l not in camera_sources]:
+                    lanes.pop(lane)
+                    scheduler.forget(lane)
+                    active_emergencies.pop(lane, None)
+
+                # Lanes still opening their first source have no reader yet
+                due = scheduler.plan(source_manager.lanes(), optimizer)
+                if due:
+                    # Get current data - this is CPU intensive, keep it off the event loop
+                    data = await asyncio.to_thread(sample_lanes, due)
+                    for lane, result in data.items():
+                        scheduler.record(lane, result)
+                    lanes.update(data)
+
+                    timings = optimizer.compute_green_time(lanes, sampled=data.keys())
+
+                    # Cache the results
+                    cache = {
+                        "lanes": lanes,
+                        "signal_times": timings,
+                        "timestamp": datetime.now().strftime("%H:%M:%S"),
+                        "cached_at": time.time(),
+                        "seq": app.state.traffic_cache.get("seq", 0) + 1,
+                        "startup_time": app.state.traffic_cache.get("startup_time", time.time())
+                    }
+                    # Store in global variable for access by endpoints
+                    app.state.traffic_cache = cache
+                    publish_state()
                 
             except Exception as e:
                 logger.error(f"Error in traffic polling: {e}")
                 traceback.print_exc()
                 
-            # Wait before next poll - adjust timing as needed
-            await asyncio.sleep(1.5)
+            # Short tick - the scheduler decides which lanes are actually due
+            await asyncio.sleep(0.25)
     except Exception as e:
         logger.error(f"Traffic polling task error: {e}")
         traceback.print_exc()
 
 
+def check_health(timeout: float = 5.0) -> dict:
+    """Run the (blocking) health checks; called from the watchdog only."""
+    # Check detector
+    detector_status = "ok"
+    if detector.state == "error":
+        detector_status = f"error: {detector.load_error}"
+    elif not detector.ready:
+        detector_status = detector.state
+    else:
+        try:
+            # Simple detection on a dummy image - health is the lowest priority
+            # class, so a saturated queue shows up as a timeout
+            if not inference_service.probe(timeout):
+                detector_status = f"degraded: no inference slot within {timeout:.0f}s"
+        except Exception as e:
+            detector_status = f"error: {str(e)}"
+
+    # Check video sources from the readers' cached state
+    sources_status = {}
+    reader_status = source_manager.status()
+    for lane, src in camera_sources.items():
+        if not is_stream(src) and not os.path.exists(src):
+            sources_status[lane] = "file not found"
+        else:
+            sources_status[lane] = reader_status.get(lane, {}).get("state", "not started")
+
+    return {
+        "detector": detector_status,
+        "sources": sources_status,
+        "checked_at": time.time()
+    }
+
+
+async def health_watchdog_task(interval: float = 15.0):
+    """Background task that refreshes the cached health status."""
+    while not stop_event.is_set():
+        try:
+            app.state.health_status = await asyncio.to_thread(check_health)
+            publish_state()
+        except Exception as e:
+            logger.error(f"Health check error: {e}")
+        await asyncio.sleep(interval)
+
+
+def producer_status() -> dict:
+    """State owned by the producer that every worker needs to serve reads."""
+    if app.state.role == "follower":
+        return app.state.shared_status
+    return {
+        "camera_sources": camera_sources,
+        "sources_status": source_manager.status(),
+        "detector": detector.status(),
+        "health_status": app.state.health_status,
+        "emergency_events": list(emergency_bus.recent),
+        "scheduler": scheduler.get_metrics(),
+        "detection_cache": detection_cache.get_metrics(),
+    }
+
+
+def publish_state() -> None:
+    """Publish the producer's results once for all workers (shared mode only)."""
+    if app.state.shared is None or not app.state.shared.is_producer:
+        return
+    app.state.shared.publish({
+        "traffic_cache": app.state.traffic_cache,
+        "status": producer_status(),
+        "producer_pid": os.getpid()
+    })
+
+
+def apply_camera_sources(sources: Dict[str, str]) -> dict:
+    """Switch to a new camera configuration (producer only)."""
+    global camera_sources
+    camera_sources = sources
+    changes = source_manager.reconfigure(sources)
+    publish_state()
+    return changes
+
+
+async def start_producer():
+    """Start the camera/inference pipeline in this process."""
+    app.state.role = "producer"
+
+    # Load the model, cached detections and camera sources in the background
+    detector.load_async()
+    app.state.cache_load_task = asyncio.create_task(asyncio.to_thread(detection_cache.load))
+    source_manager.reconfigure(camera_sources)
+
+    # Start background polling task
+    app.state.background_task = asyncio.create_task(traffic_poll_task())
+    app.state.health_task = asyncio.create_task(health_watchdog_task())
+    if app.state.shared is not None:
+        # Forwarded commands up to now were handled by the previous producer
+        # and are already reflected in the restored camera_sources
+        app.state.shared.reset_control()
+        app.state.control_task = asyncio.create_task(control_task())
+    publish_state()
+    logger.info(f"Worker {os.getpid()} is the traffic producer")
+
+
+async def control_task():
+    """Producer: apply configuration changes forwarded by other workers."""
+    shared = app.state.shared
+    while not stop_event.is_set():
+        gen, command = shared.control.read(shared.control_gen)
+        if command is not None:
+            shared.control_gen = gen
+            if "camera_sources" in command:
+                apply_camera_sources(command["camera_sources"])
+        await asyncio.sleep(0.2)
+
+
+async def follower_task():
+    """Mirror the producer's published state; take over if the producer exits."""
+    global camera_sources
+    shared = app.state.shared
+    next_election = 0.0
+    first = True
+    while not stop_event.is_set():
+        snap = shared.read()
+        if snap is not None:
+            app.state.traffic_cache = snap["traffic_cache"]
+            app.state.shared_status = snap["status"]
+            app.state.health_status = snap["status"].get("health_status", app.state.health_status)
+
+            # Re-publish the producer's new emergency events to this worker's clients
+            for event in snap["status"].get("emergency_events", []):
+                if event["seq"] > emergency_bus.seq:
+                    if first:
+                        emergency_bus.seq = event["seq"]    # don't replay history on join
+                        continue
+                    event.pop("published_at", None)
+                    emergency_bus.publish(event)
+            first = False
+
+        if time.time() >= next_election:
+            next_election = time.time() + 1.0
+            if shared.try_become_producer():
+                # Continue from the last published configuration and sequence
+                camera_sources = app.state.shared_status.get("camera_sources", camera_sources)
+                await start_producer()
+                return
+
+        await asyncio.sleep(0.05)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize app state and start background tasks."""
@@ -118,11 +355,33 @@ async def startup_event():
         "signal_times": {},
         "timestamp": datetime.now().strftime("%H:%M:%S"),
         "cached_at": time.time(),
+        "seq": 0,
         "startup_time": time.time()
     }
     
-    # Start background polling task
-    app.state.background_task = asyncio.create_task(traffic_poll_task())
+    app.state.health_status = {"detector": detector.state, "sources": {}, "checked_at": None}
+    app.state.shared_status = {}
+    app.state.shared = None
+    app.state.role = "standalone"
+    app.state.loop = asyncio.get_running_loop()
+
+    # Every model call goes through the shared inference queue
+    inference_service.start()
+
+    # With `uvicorn --workers N`, set TRAFFIC_SHARED_STATE=1 so only one
+    # elected worker runs inference and the rest serve its published state
+    if os.environ.get("TRAFFIC_SHARED_STATE", "0") == "1":
+        app.state.shared = SharedState(os.environ.get("TRAFFIC_SHARED_NAMESPACE", "traffic"))
+        if app.state.shared.try_become_producer():
+            await start_producer()
+        else:
+            app.state.role = "follower"
+            app.state.follower_task = asyncio.create_task(follower_task())
+            logger.info(f"Worker {os.getpid()} is serving the shared producer state")
+    else:
+        await start_producer()
+        app.state.role = "standalone"
+
     logger.info("Traffic Management System API started")
 
 
@@ -131,12 +390,21 @@ async def shutdown_event():
     """Clean up resources on shutdown."""
     logger.info("Shutting down Traffic Management System API")
     stop_event.set()
-    if hasattr(app.state, 'background_task'):
-        app.state.background_task.cancel()
-        try:
-            await app.state.background_task
-        except asyncio.CancelledError:
-            pass
+    for name in ('background_task', 'health_task', 'control_task', 'follower_task'):
+        if hasattr(app.state, name):
+            task = getattr(app.state, name)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    annotation_jobs.shutdown()
+    inference_service.stop()
+    if app.state.role != "follower":
+        source_manager.close()
+        detection_cache.save()
+    if app.state.shared is not None:
+        app.state.shared.close()
     logger.info("Resources cleaned up")
 
 
@@ -146,7 +414,7 @@ async def traffic_feed():
     Server-sent events endpoint for real-time traffic data.
     Returns traffic counts, emergency vehicle presence, and optimized signal timings.
     """
-    client_id = id(time.time())
+    client_id = uuid.uuid4().hex
     active_clients.add(client_id)
     
     async def stream():
@@ -158,12 +426,14 @@ async def traffic_feed():
                 payload = {
                     "lanes": cache["lanes"],
                     "signal_times": cache["signal_times"],
-                    "timestamp": cache["timestamp"]
+                    "timestamp": cache["timestamp"],
+                    "seq": cache.get("seq", 0),
+                    "cached_at": cache.get("cached_at")
                 }
                 yield f"data: {json.dumps(payload)}\n\n"
                 
-                # Delay between updates
-                await asyncio.sleep(1.0)
+                # Delay between updates - cut short by emergency events
+                await emergency_bus.wait(timeout=1.0)
         except Exception as e:
             logger.error(f"Stream error for client {client_id}: {e}")
         finally:
@@ -182,6 +452,40 @@ async def traffic_feed():
     )
 
 
+@app.get("/emergency_feed")
+async def emergency_feed():
+    """
+    Server-sent events endpoint for emergency preemption events.
+    Events are pushed as soon as a lane's detection flags or clears an
+    emergency, together with the preemptively re-planned signal timings.
+    """
+    queue = emergency_bus.subscribe()
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                emergency_bus.record_delivery(event)
+        finally:
+            emergency_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 def determine_file_type(filename: str) -> str:
     """Determine if a file is an image or video based on its extension."""
     video_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.mkv'}
@@ -193,84 +497,6 @@ def determine_file_type(filename: str) -> str:
         return "image"
 
 
-def process_video(video_path: str, sample_interval: int = 30):
-    """
-    Process a video file to extract traffic data.
-    
-    Args:
-        video_path: Path to the video file
-        sample_interval: Process every Nth frame
-    
-    Returns:
-        tuple: (max_count, emergency_detected, representative_frame_b64, video_url)
-    """
-    try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise Exception(f"Cannot open video file: {video_path}")
-        
-        # Get video properties
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        duration = frame_count / fps
-        
-        # For very short videos, sample more frames
-        if duration < 10:
-            sample_interval = max(5, sample_interval // 3)
-        
-        # Initialize tracking variables
-        max_count = 0
-        emergency_detected = False
-        best_frame = None
-        best_frame_b64 = ""
-        frame_index = 0
-        
-        # Process frames at intervals
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            # Process every Nth frame
-            if frame_index % sample_interval == 0:
-                # Run detection on this frame
-                count, emergency, image_b64 = detector.detect_objects(frame)
-                
-                # Track maximum vehicle count and emergency vehicles
-                if count > max_count:
-                    max_count = count
-                    best_frame = frame.copy()
-                    best_frame_b64 = image_b64
-                
-                if emergency:
-                    emergency_detected = True
-            
-            frame_index += 1
-        
-        # Clean up
-        cap.release()
-        
-        # If we didn't find any frames with vehicles, use the first analyzed frame
-        if best_frame_b64 == "":
-            # Use first frame as fallback
-            cap = cv2.VideoCapture(video_path)
-            ret, frame = cap.read()
-            if ret:
-                count, emergency, best_frame_b64 = detector.detect_objects(frame)
-            cap.release()
-        
-        # For web access, the path needs to be relative to the API endpoint
-        # For now we'll return the raw path, but this should be converted to a URL
-        video_url = f"/media/{os.path.basename(video_path)}"
-        
-        return max_count, emergency_detected, best_frame_b64, video_url
-        
-    except Exception as e:
-        logger.error(f"Error processing video: {e}")
-        traceback.print_exc()
-        return 0, False, "", None
-
-
 @app.post("/upload_media")
 async def upload_media(file: UploadFile = File(...)):
     """
@@ -299,7 +525,7 @@ async def upload_media(file: UploadFile = File(...)):
                 raise HTTPException(status_code=400, detail="Invalid image format")
                 
             # Process the image
-            count, emergency, image = detector.detect_objects(frame)
+            count, emergency, image = await inference_service.detect_async(frame, UPLOAD)
             
             # Return response with image data
             return MediaAnalysisResponse(
@@ -326,16 +552,17 @@ async def upload_media(file: UploadFile = File(...)):
             
             logger.info(f"Saved uploaded video to {temp_file_path}")
             
-            # Process the video file
-            count, emergency, image, video_url = process_video(temp_file_path)
+            # Render the annotated copy in the background; its sampled detections
+            # also give the count/emergency summary, so the video goes through the
+            # model only once. Poll /render_jobs/{id} for progress and the results.
+            annotated_name = f"{file_id}_annotated.mp4"
+            job = annotation_jobs.start(temp_file_path, os.path.join(temp_dir, annotated_name))
             
-            # Return response with video analysis results
+            # Return right away - the analysis results come with the job status
             return MediaAnalysisResponse(
-                count=count,
-                emergency=emergency,
-                image=image,  # Representative frame with detection
                 media_type="video",
-                video_url=video_url  # URL to access the processed video
+                video_url=f"/media/{os.path.basename(temp_file_path)}",  # URL to access the uploaded video
+                render_job_id=job.id
             )
         
         else:
@@ -347,6 +574,22 @@ async def upload_media(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Media processing error: {str(e)}")
 
 
+@app.get("/render_jobs/{job_id}")
+async def get_render_job(job_id: str):
+    """
+    Get progress of an annotated-video rendering job.
+    Once the job is done this also carries the video's analysis results
+    (count, emergency and the annotated frame with the most vehicles).
+    """
+    # Jobs started by another worker are served from their saved status
+    status = annotation_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    if status["state"] == "done":
+        status["annotated_video_url"] = f"/media/{status['output_file']}"
+    return status
+
+
 # For backward compatibility - redirect to new endpoint
 @app.post("/upload_image")
 async def upload_image(file: UploadFile = File(...)):
@@ -354,6 +597,72 @@ async def upload_image(file: UploadFile = File(...)):
     return await upload_media(file)
 
 
+@app.post("/upload_batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    batch_size: int = Query(8, ge=1, le=64),
+    include_images: bool = Query(False)
+):
+    """
+    Analyze many traffic images in one request.
+    Accepts any number of images and/or zip/tar archives of images and
+    streams one NDJSON line per image as soon as its micro-batch finishes,
+    followed by a final summary line.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    # The uploads are closed as soon as this function returns - work from our own copies
+    spooled = await asyncio.to_thread(spool_uploads, files)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=2 * batch_size)
+    cancelled = threading.Event()
+
+    def emit(record: dict):
+        # Block the worker while the client is behind - keeps memory bounded
+        future = asyncio.run_coroutine_threadsafe(queue.put(record), loop)
+        while not cancelled.is_set():
+            try:
+                future.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+
+    def run():
+        try:
+            summary = analyze_batch(spooled, lambda frames: inference_service.detect_many(frames, UPLOAD), emit,
+                                    batch_size=batch_size, include_images=include_images,
+                                    cancelled=cancelled)
+            emit({"summary": summary})
+        except Exception as e:
+            logger.error(f"Error processing batch upload: {e}")
+            traceback.print_exc()
+            emit({"error": f"Batch processing error: {str(e)}"})
+        finally:
+            # The stream may be cancelled again while it waits for us on a client
+            # disconnect, so the worker - which always finishes - owns the cleanup
+            try:
+                emit(None)
+            finally:
+                remove_spooled(spooled)
+
+    async def stream():
+        worker = loop.run_in_executor(None, run)
+        try:
+            while True:
+                record = await queue.get()
+                if record is None:
+                    break
+                yield json.dumps(record) + "\n"
+        finally:
+            cancelled.set()
+            await worker
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 # Serve uploaded media files
 app.mount("/media", StaticFiles(directory="uploaded_media"), name="uploaded_media")
 
@@ -363,32 +672,42 @@ async def get_camera_sources():
     """
     Get the current camera sources configuration.
     """
-    return JSONResponse(camera_sources)
+    return JSONResponse(producer_status().get("camera_sources", camera_sources))
 
 
 @app.post("/camera_sources")
 async def update_camera_sources(sources: Dict[str, str]):
     """
     Update the camera sources configuration.
-    Requires a dictionary mapping lane names to video file paths.
+    Requires a dictionary mapping lane names to video file paths or
+    rtsp:// / http:// stream URLs.
     """
-    global camera_sources
     try:
         # Validate sources
         for lane, path in sources.items():
-            if not os.path.exists(path):
+            if not is_stream(path) and not os.path.exists(path):
                 return JSONResponse({
                     "status": "warning",
                     "message": f"Source file for {lane} not found: {path}",
                     "updated": False
                 }, status_code=400)
                 
-        # Update sources
-        camera_sources = sources
+        if app.state.role == "follower":
+            # Another worker owns the cameras - forward the change to it
+            app.state.shared.control.publish({"camera_sources": sources})
+            return JSONResponse({
+                "status": "success",
+                "message": "Camera sources update forwarded to producer",
+                "sources": sources
+            })
+
+        # Update sources - only changed lanes are reopened, in the background
+        changes = apply_camera_sources(sources)
         return JSONResponse({
             "status": "success",
             "message": "Camera sources updated",
-            "sources": camera_sources
+            "sources": camera_sources,
+            "changes": changes
         })
     except Exception as e:
         logger.error(f"Error updating camera sources: {e}")
@@ -399,42 +718,54 @@ async def update_camera_sources(sources: Dict[str, str]):
         }, status_code=500)
 
 
+@app.get("/camera_sources/status")
+async def get_camera_sources_status():
+    """
+    Get per-lane reader state, including sources still being opened.
+    """
+    return JSONResponse(producer_status().get("sources_status", {}))
+
+
+@app.get("/livez")
+async def liveness():
+    """
+    Liveness probe - the process is up and serving requests.
+    """
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Readiness probe - the model is loaded and at least one camera reader is active.
+    Reports cached state only; never touches the model or the cameras.
+    """
+    status = producer_status()
+    readers = status.get("sources_status", {})
+    model = status.get("detector", {"state": "unknown"})
+    ready = model["state"] == "ready" and (not readers or any(r["state"] == "ok" for r in readers.values()))
+    return JSONResponse({
+        "status": "ready" if ready else "not ready",
+        "role": app.state.role,
+        "model": model,
+        "readers": {lane: r["state"] for lane, r in readers.items()},
+        "timestamp": datetime.now().isoformat()
+    }, status_code=200 if ready else 503)
+
+
 @app.get("/health")
 async def health_check():
     """
     Health check endpoint for monitoring system status.
+    Served from the background watchdog's last results.
     """
-    # Check detector
-    detector_status = "ok"
-    try:
-        # Simple detection on a dummy image
-        dummy = np.zeros((100, 100, 3), dtype=np.uint8)
-        detector.detect_objects(dummy)
-    except Exception as e:
-        detector_status = f"error: {str(e)}"
-    
-    # Check video sources
-    sources_status = {}
-    for lane, src in camera_sources.items():
-        if not os.path.exists(src):
-            sources_status[lane] = "file not found"
-            continue
-            
-        try:
-            cap = cv2.VideoCapture(src)
-            if cap.isOpened():
-                sources_status[lane] = "ok"
-                cap.release()
-            else:
-                sources_status[lane] = "cannot open"
-        except Exception as e:
-            sources_status[lane] = f"error: {str(e)}"
-    
+    health = app.state.health_status
     return {
         "status": "running",
         "uptime": time.time() - app.state.traffic_cache.get("startup_time", time.time()),
-        "detector": detector_status,
-        "sources": sources_status,
+        "detector": health["detector"],
+        "sources": health["sources"],
+        "checked_at": health["checked_at"],
         "active_clients": len(active_clients),
         "timestamp": datetime.now().isoformat()
     }
@@ -445,10 +776,22 @@ async def get_metrics():
     """
     Get system performance metrics.
     """
-    # Get frame processing times from detector if available
+    # Pipeline metrics come from the producer (possibly another worker)
+    status = producer_status()
+    sched = status.get("scheduler", {})
     return {
         "active_connections": len(active_clients),
+        "worker_pid": os.getpid(),
+        "role": app.state.role,
         "cache_age_seconds": time.time() - app.state.traffic_cache.get("cached_at", time.time()),
+        "lane_staleness": {lane: sched.get("staleness", {}).get(lane) for lane in status.get("camera_sources", {})},
+        "scheduler": sched,
+        "detection_cache": status.get("detection_cache", {}),
+        "emergency": emergency_bus.get_metrics(),
+        "inference": inference_service.get_metrics(),
+        # Uploads run on the receiving worker, so a follower that served one holds its own model copy
+        "local_model": detector.status(),
+        "streams": {lane: st["stats"] for lane, st in status.get("sources_status", {}).items() if st["live"]},
         "timestamp": datetime.now().isoformat()
     }
 
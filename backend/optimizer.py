@@ -2,7 +2,7 @@
 
 import logging
 import time
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from collections import deque
 
 # Configure logging
@@ -37,12 +37,15 @@ class TrafficOptimizer:
         
         logger.info("TrafficOptimizer initialized")
 
-    def compute_green_time(self, data: dict) -> dict:
+    def compute_green_time(self, data: dict, sampled: Optional[Iterable[str]] = None) -> dict:
         """
         Compute optimal green times for each lane based on traffic data.
         
         Args:
             data: Dictionary with lane data {lane_name: {'count': int, 'emergency': bool}}
+            sampled: Lanes whose counts are fresh this call (default: all lanes).
+                Only these are added to the trend history, so re-planning with
+                cached counts does not compress the history window.
             
         Returns:
             Dictionary with green times {lane_name: seconds}
@@ -51,7 +54,7 @@ class TrafficOptimizer:
         
         try:
             # Update history
-            self._update_history(data)
+            self._update_history(data, sampled)
             
             # Initialize result with default allocation
             total = sum(self.min_green for _ in data)
@@ -156,7 +159,7 @@ class TrafficOptimizer:
             count = info.get('count', 0)
             
             # Get trend (rate of change)
-            trend = self._calculate_trend(lane)
+            trend = self.trend(lane)
             
             # Calculate wait time factor
             wait_factor = self._calculate_wait_factor(lane)
@@ -210,9 +213,10 @@ class TrafficOptimizer:
         
         return times
         
-    def _update_history(self, data: dict) -> None:
+    def _update_history(self, data: dict, sampled: Optional[Iterable[str]] = None) -> None:
         """Update traffic history for trend analysis."""
         current_time = time.time()
+        sampled = set(data if sampled is None else sampled)
         
         for lane, info in data.items():
             count = info.get('count', 0)
@@ -221,6 +225,10 @@ class TrafficOptimizer:
             if lane not in self.history:
                 self.history[lane] = deque(maxlen=self.history_window)
                 self.last_green[lane] = current_time - 60  # Default: assume green 60s ago
+            
+            # Cached counts for lanes that were not re-sampled are not new data points
+            if lane not in sampled:
+                continue
                 
             # Add current count to history
             self.history[lane].append((current_time, count))
@@ -230,7 +238,7 @@ class TrafficOptimizer:
                    current_time - self.history[lane][0][0] > 1800):
                 self.history[lane].popleft()
     
-    def _calculate_trend(self, lane: str) -> float:
+    def trend(self, lane: str) -> float:
         """Calculate traffic trend (positive = increasing, negative = decreasing)."""
         if lane not in self.history or len(self.history[lane]) < 2:
             return 0.0
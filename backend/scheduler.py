@@ -0,0 +1,151 @@
+# backend/scheduler.py
+
+import logging
+import time
+from typing import Dict, List, Optional, Iterable
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("scheduler")
+
+
+class LaneScheduler:
+    """
+    Deadline-aware scheduler deciding which lanes get sampled each cycle.
+
+    Every lane is given a target refresh interval derived from its current
+    state (emergency, rising traffic, idle, normal). Lanes are served in
+    earliest-deadline-first order, and a token bucket caps the number of
+    inferences run per second across all lanes.
+    """
+
+    def __init__(self,
+                 emergency_interval: float = 0.5,
+                 rising_interval: float = 1.5,
+                 base_interval: float = 3.0,
+                 idle_interval: float = 6.0,
+                 emergency_hold: float = 30.0,
+                 rising_threshold: float = 0.2,
+                 max_inferences_per_sec: float = 4.0):
+        # Target refresh intervals in seconds for each lane state
+        self.intervals = {
+            "emergency": emergency_interval,
+            "rising": rising_interval,
+            "normal": base_interval,
+            "idle": idle_interval,
+        }
+        self.emergency_hold = emergency_hold        # Keep emergency cadence this long after a sighting
+        self.rising_threshold = rising_threshold    # Normalized optimizer trend counted as "rising"
+
+        # Global inference budget (token bucket, burst of one second)
+        self.rate = max_inferences_per_sec
+        self.capacity = max(1.0, max_inferences_per_sec)
+        self.tokens = self.capacity
+        self.last_refill = time.time()
+
+        # Per-lane bookkeeping
+        self.last_sampled = {}      # Lane -> timestamp of last inference
+        self.last_emergency = {}    # Lane -> timestamp of last emergency detection
+        self.last_count = {}        # Lane -> last vehicle count
+        self.states = {}            # Lane -> state name used for the last plan
+        self.deferred = 0           # Due lanes pushed back by the budget
+
+        logger.info("LaneScheduler initialized")
+
+    def lane_state(self, lane: str, optimizer=None, now: Optional[float] = None) -> str:
+        """Classify a lane as emergency, rising, idle or normal."""
+        now = now or time.time()
+
+        if now - self.last_emergency.get(lane, float("-inf")) <= self.emergency_hold:
+            return "emergency"
+
+        if optimizer is not None and optimizer.trend(lane) > self.rising_threshold:
+            return "rising"
+
+        if self.last_count.get(lane) == 0:
+            return "idle"
+
+        return "normal"
+
+    def deadline(self, lane: str, optimizer=None, now: Optional[float] = None) -> float:
+        """Return the timestamp by which the lane should be refreshed."""
+        if lane not in self.last_sampled:
+            return 0.0          # Never sampled: due immediately
+
+        state = self.lane_state(lane, optimizer, now)
+        self.states[lane] = state
+        return self.last_sampled[lane] + self.intervals[state]
+
+    def plan(self, lanes: Iterable[str], optimizer=None, now: Optional[float] = None) -> List[str]:
+        """
+        Select the lanes to sample in this cycle.
+
+        Args:
+            lanes: Names of the currently configured lanes
+            optimizer: Optional TrafficOptimizer used for trend information
+            now: Current timestamp (defaults to time.time())
+
+        Returns:
+            List of due lanes ordered by earliest deadline, limited by the budget
+        """
+        now = now or time.time()
+        self._refill(now)
+
+        deadlines = {lane: self.deadline(lane, optimizer, now) for lane in lanes}
+        due = sorted((l for l, d in deadlines.items() if d <= now), key=lambda l: deadlines[l])
+
+        allowed = int(self.tokens)
+        selected = due[:allowed]
+        self.tokens -= len(selected)
+
+        if len(due) > len(selected):
+            self.deferred += len(due) - len(selected)
+            logger.debug(f"Inference budget exhausted, deferring {due[len(selected):]}")
+
+        return selected
+
+    def record(self, lane: str, result: dict, now: Optional[float] = None) -> None:
+        """Record a fresh inference result for a lane."""
+        now = now or time.time()
+        self.last_sampled[lane] = now
+        self.last_count[lane] = result.get("count", 0)
+        if result.get("emergency", False):
+            self.last_emergency[lane] = now
+
+    def forget(self, lane: str) -> None:
+        """Drop all state for a lane that is no longer configured."""
+        for table in (self.last_sampled, self.last_emergency, self.last_count, self.states):
+            table.pop(lane, None)
+
+    def staleness(self, lanes: Optional[Iterable[str]] = None, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Seconds since each lane was last refreshed (None if never sampled)."""
+        now = now or time.time()
+        lanes = self.last_sampled.keys() if lanes is None else lanes
+        return {
+            lane: round(now - self.last_sampled[lane], 3) if lane in self.last_sampled else None
+            for lane in lanes
+        }
+
+    def _refill(self, now: float) -> None:
+        """Top up the inference budget based on elapsed time."""
+        elapsed = max(0.0, now - self.last_refill)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def get_metrics(self) -> dict:
+        """Return scheduler state for monitoring."""
+        return {
+            "staleness": self.staleness(),
+            "states": dict(self.states),
+            "intervals": dict(self.intervals),
+            "budget_per_sec": self.rate,
+            "tokens_available": round(self.tokens, 2),
+            "deferred_total": self.deferred,
+        }
+
+
+# Create scheduler instance for export
+scheduler = LaneScheduler()
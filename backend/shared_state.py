@@ -0,0 +1,197 @@
+# backend/shared_state.py
+
+import fcntl
+import json
+import logging
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("shared_state")
+
+
+class ProducerLock:
+    """
+    Non-blocking exclusive file lock used to elect the producer worker.
+
+    The kernel drops the lock when the holding process exits, so a waiting
+    worker can take over if the producer dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def try_acquire(self) -> bool:
+        if self.fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    @property
+    def held(self) -> bool:
+        return self.fd is not None
+
+    def release(self) -> None:
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+class SharedSnapshot:
+    """
+    JSON document published through a named shared-memory segment.
+
+    Header is int64[2]: a generation counter (odd while a write is in
+    progress) and the payload length. Readers copy the payload and retry if
+    the generation changed underneath them, so they never block the writer.
+    Concurrent writers must serialize through write_lock_path.
+    """
+
+    HEADER_BYTES = 16
+
+    def __init__(self, name: str, size: int = 16 * 2 ** 20, write_lock_path: Optional[str] = None):
+        self.name = name
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.header = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)
+            self.header[:] = 0
+        except FileExistsError:
+            self.shm = shared_memory.SharedMemory(name=name, create=False)
+            self.header = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)
+
+        # The segment outlives individual workers; stop the resource tracker
+        # from unlinking it when whichever process registered it exits.
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        self.capacity = self.shm.size - self.HEADER_BYTES
+        self.write_lock_path = write_lock_path
+
+    @property
+    def generation(self) -> int:
+        return int(self.header[0])
+
+    def publish(self, obj) -> bool:
+        """Serialize obj and publish it; returns False if it does not fit."""
+        data = json.dumps(obj).encode()
+        if len(data) > self.capacity:
+            logger.error(f"Snapshot of {len(data)} bytes exceeds segment {self.name} ({self.capacity} bytes)")
+            return False
+
+        lock_fd = None
+        if self.write_lock_path:
+            lock_fd = os.open(self.write_lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            gen = int(self.header[0])
+            if gen % 2:
+                gen += 1                # a writer died mid-write; start from a clean state
+            self.header[0] = gen + 1                                # odd: write in progress
+            self.shm.buf[self.HEADER_BYTES:self.HEADER_BYTES + len(data)] = data
+            self.header[1] = len(data)
+            self.header[0] = gen + 2                                # even: complete
+        finally:
+            if lock_fd is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+        return True
+
+    def read(self, last_generation: int = -1, retries: int = 5) -> Tuple[int, Optional[object]]:
+        """
+        Read the current document if it changed since last_generation.
+
+        Returns:
+            (generation, document) or (last_generation, None) if nothing new
+        """
+        for _ in range(retries):
+            gen = int(self.header[0])
+            if gen == last_generation or gen == 0:
+                return last_generation, None
+            if gen % 2:
+                time.sleep(0.001)
+                continue
+            length = int(self.header[1])
+            data = bytes(self.shm.buf[self.HEADER_BYTES:self.HEADER_BYTES + length])
+            if int(self.header[0]) == gen:
+                try:
+                    return gen, json.loads(data)
+                except ValueError:
+                    pass
+        return last_generation, None
+
+    def close(self) -> None:
+        self.header = None
+        self.shm.close()
+
+
+class SharedState:
+    """
+    Coordinates several uvicorn workers around a single producer.
+
+    One worker holds the producer lock, runs the camera/inference loop and
+    publishes each result once to the snapshot segment; every other worker
+    mirrors that snapshot and forwards configuration changes through the
+    control segment.
+
+    The named segments survive the server, so snapshots are stamped with a
+    run id (by default the pid of the supervisor that forked the workers)
+    and snapshots left behind by an earlier run are ignored.
+    """
+
+    def __init__(self, namespace: str = "traffic", data_dir: str = "app_data",
+                 run_id: Optional[str] = None):
+        self.run_id = run_id or os.environ.get("TRAFFIC_RUN_ID") or str(os.getppid())
+        self.lock = ProducerLock(os.path.join(data_dir, f"{namespace}.producer.lock"))
+        self.snapshot = SharedSnapshot(f"{namespace}_snapshot")
+        self.control = SharedSnapshot(f"{namespace}_control", size=2 ** 20,
+                                      write_lock_path=os.path.join(data_dir, f"{namespace}.control.lock"))
+        self.snapshot_gen = -1
+        self.control_gen = self.control.generation      # ignore commands issued before we started
+
+    @property
+    def is_producer(self) -> bool:
+        return self.lock.held
+
+    def try_become_producer(self) -> bool:
+        return self.lock.try_acquire()
+
+    def publish(self, state: dict) -> bool:
+        """Publish the producer's state for the other workers of this run."""
+        return self.snapshot.publish(dict(state, run_id=self.run_id))
+
+    def read(self) -> Optional[dict]:
+        """Return the producer's state if it changed, ignoring other runs' snapshots."""
+        gen, snap = self.snapshot.read(self.snapshot_gen)
+        if snap is None:
+            return None
+        self.snapshot_gen = gen
+        if snap.get("run_id") != self.run_id:
+            return None
+        return snap
+
+    def reset_control(self) -> None:
+        """Skip commands issued before now (e.g. already applied by a previous producer)."""
+        self.control_gen = self.control.generation
+
+    def close(self) -> None:
+        self.lock.release()
+        self.snapshot.close()
+        self.control.close()
@@ -0,0 +1,488 @@
+# backend/sources.py
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import cv2
+import numpy as np
+
+from decode import open_capture, DETECTOR_SIDE
+from detection_cache import file_identity
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sources")
+
+
+class LaneReader:
+    """
+    Persistent capture for a single lane, looping file sources on EOF.
+
+    Files are played back in real time on a fixed frame grid (multiples of
+    frame_stride from the start of the clip), so every pass over a looping
+    clip samples the same frame indices and their detections can be memoized.
+    """
+
+    live = False
+
+    def __init__(self, src: str, max_side: int = DETECTOR_SIDE, threads: int = 2,
+                 frame_stride: int = 5):
+        self.src = src
+        self.max_side = max_side    # Frames are decoded at most this large
+        self.threads = threads      # Decoder threads for this lane
+        self.frame_stride = frame_stride
+        self.cap = None
+        self.fps = 25.0
+        self.source_id = None       # File identity used for detection caching
+        self.frame = None           # Most recent decoded frame
+        self.position = -1          # Index of the most recent frame within the clip
+        self.frames_read = 0
+        self.opened_at = None
+        self.last_advance = None
+        self._decode_times = deque(maxlen=100)
+
+    def open(self, warmup_frames: int = 3) -> None:
+        """
+        Open the source and decode its first frames.
+
+        Raises:
+            IOError: If the source cannot be opened or yields no frames
+        """
+        cap = open_capture(self.src, self.max_side, self.threads)
+        if not cap.isOpened():
+            cap.release()
+            raise IOError(f"Cannot open source: {self.src}")
+
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self.source_id = file_identity(self.src)
+        for _ in range(max(1, warmup_frames)):
+            ok, _ = self.read()
+            if not ok:
+                self.release()
+                raise IOError(f"Source opened but produced no frames: {self.src}")
+
+        # Start playback on the frame grid
+        self._rewind()
+        self.opened_at = time.time()
+
+    def _rewind(self) -> None:
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.position = -1
+
+    def read(self):
+        """Read the next frame, rewinding looping files at the end."""
+        t0 = time.perf_counter()
+        ok, f = self.cap.read()
+        if not ok:
+            self._rewind()
+            ok, f = self.cap.read()
+        if ok:
+            self.frame = f
+            self.position += 1
+            self.frames_read += 1
+            self._decode_times.append(time.perf_counter() - t0)
+        return ok, f
+
+    def advance(self, seconds: float):
+        """
+        Move playback forward by about `seconds` (rounded to the frame grid)
+        and return the frame there. Skipped frames are grabbed, not converted.
+        """
+        stride = self.frame_stride
+        steps = max(1, int(round(seconds * self.fps / stride))) * stride
+        if self.position < 0:
+            steps = 1                   # first frame of a pass is index 0
+        for _ in range(steps - 1):
+            if not self.cap.grab():
+                self._rewind()
+                break
+            self.position += 1
+        return self.read()
+
+    def cache_key(self):
+        """(source_id, frame_index) of the current frame, for detection memoization."""
+        if self.source_id is None or self.position < 0:
+            return None
+        return self.source_id, self.position
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def stats(self) -> dict:
+        return {
+            "frames_read": self.frames_read,
+            "position": self.position,
+            "avg_decode_ms": _avg_ms(self._decode_times),
+            "frame_shape": list(self.frame.shape) if self.frame is not None else None,
+        }
+
+
+def _avg_ms(samples) -> Optional[float]:
+    samples = list(samples)
+    return round(1000 * sum(samples) / len(samples), 2) if samples else None
+
+
+class StreamReader:
+    """
+    Reader for live network streams (RTSP/HTTP) with latest-frame semantics.
+
+    A dedicated thread keeps draining the stream so OpenCV's internal buffer
+    never fills with stale frames; only the newest decoded frame is kept.
+    Dropped connections are re-established with exponential backoff.
+    """
+
+    live = True
+
+    def cache_key(self):
+        return None             # Live frames never repeat
+
+    def __init__(self, src: str, max_side: int = DETECTOR_SIDE, threads: int = 2,
+                 open_timeout: float = 10.0, min_backoff: float = 0.5,
+                 max_backoff: float = 10.0, max_frame_age: float = 5.0):
+        self.src = src
+        self.max_side = max_side
+        self.threads = threads
+        self.open_timeout = open_timeout
+        self.max_frame_age = max_frame_age      # Older frames are not served (stream stalled)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.cap = None
+        self.frame = None           # Newest decoded frame
+        self.frame_time = None      # When the newest frame was decoded
+        self.frames_read = 0        # Frames decoded from the stream
+        self.frames_consumed = 0    # Frames handed out by read()
+        self.drops = 0              # Frames overwritten before being consumed
+        self.reconnects = 0
+        self.opened_at = None
+        self.last_error = None
+
+        self._fresh = False
+        self._ages = deque(maxlen=100)
+        self._decode_times = deque(maxlen=100)
+        self._decode_costs = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._first_frame = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self, warmup_frames: int = 3) -> None:
+        """
+        Start the reader thread and wait for the first decoded frame.
+
+        Raises:
+            IOError: If no frame arrives within open_timeout
+        """
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.src}", daemon=True)
+        self._thread.start()
+
+        if not self._first_frame.wait(self.open_timeout):
+            self.release()
+            raise IOError(f"No frames from stream within {self.open_timeout}s: {self.src}"
+                          + (f" ({self.last_error})" if self.last_error else ""))
+
+        self.opened_at = time.time()
+
+    def _connect(self) -> bool:
+        cap = open_capture(self.src, self.max_side, self.threads, live=True)
+        if not cap.isOpened():
+            cap.release()
+            self.last_error = "cannot open stream"
+            return False
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.cap = cap
+        return True
+
+    def _run(self) -> None:
+        """Drain the stream continuously, reconnecting with backoff."""
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            if self.cap is None and not self._connect():
+                self._stop.wait(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+
+            t0 = time.perf_counter()
+            ok, f = self.cap.read()
+            if not ok:
+                logger.warning(f"Stream read failed, reconnecting in {backoff:.1f}s: {self.src}")
+                self.last_error = "read failed"
+                self.cap.release()
+                self.cap = None
+                self.reconnects += 1
+                self._stop.wait(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+
+            backoff = self.min_backoff
+            now = time.time()
+            with self._lock:
+                if self._fresh:
+                    self.drops += 1
+                self.frame = f
+                self.frame_time = now
+                self._fresh = True
+                self.frames_read += 1
+                self._decode_times.append(now)
+                self._decode_costs.append(time.perf_counter() - t0)
+            self._first_frame.set()
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def read(self):
+        """Return the newest decoded frame without blocking."""
+        with self._lock:
+            f = self.frame
+            if f is None or time.time() - self.frame_time > self.max_frame_age:
+                return False, None
+            if self._fresh:
+                self.frames_consumed += 1
+                self._fresh = False
+            self._ages.append(time.time() - self.frame_time)
+            return True, f
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def stats(self) -> dict:
+        """Decode rate, drops and frame age for monitoring."""
+        with self._lock:
+            times = list(self._decode_times)
+            ages = list(self._ages)
+            fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+            return {
+                "fps": round(fps, 2),
+                "frames_read": self.frames_read,
+                "frames_consumed": self.frames_consumed,
+                "drops": self.drops,
+                "reconnects": self.reconnects,
+                "frame_age_ms": round(1000 * (time.time() - self.frame_time), 1) if self.frame_time else None,
+                "avg_consumed_age_ms": _avg_ms(ages),
+                "avg_decode_ms": _avg_ms(self._decode_costs),
+                "frame_shape": list(self.frame.shape) if self.frame is not None else None,
+                "connected": self.cap is not None,
+                "last_error": self.last_error,
+            }
+
+
+STREAM_PREFIXES = ("rtsp://", "rtsps://", "http://", "https://")
+
+
+def is_stream(src: str) -> bool:
+    """True if the source is a live network stream rather than a file."""
+    return src.lower().startswith(STREAM_PREFIXES)
+
+
+def make_reader(src: str, max_side: int = DETECTOR_SIDE, threads: int = 2):
+    """Create the appropriate reader for a source."""
+    reader_cls = StreamReader if is_stream(src) else LaneReader
+    return reader_cls(src, max_side, threads)
+
+
+class SourceManager:
+    """
+    Owns one persistent reader per lane and applies configuration changes
+    incrementally.
+
+    New or changed sources are opened and validated on a background thread.
+    Once their first frames have been decoded they are swapped in at the
+    start of the next grab, so unchanged lanes are never interrupted and a
+    slow or broken source never stalls the sampling cycle.
+    """
+
+    def __init__(self, warmup_frames: int = 3, decode_side: int = DETECTOR_SIDE,
+                 decode_threads: int = 2):
+        self.warmup_frames = warmup_frames
+        self.decode_side = decode_side          # Decode straight to detector resolution
+        self.decode_threads = decode_threads    # Decoder threads per lane
+
+        self.readers = {}           # Lane -> active LaneReader
+        self.desired = {}           # Lane -> configured source
+        self.pending = {}           # Lane -> (source, generation) being opened
+        self.ready = {}             # Lane -> opened LaneReader awaiting swap
+        self.retired = []           # Readers to release at the next grab
+        self.errors = {}            # Lane -> last open error
+        self.frame_keys = {}        # Lane -> cache key of the last grabbed frame
+
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        logger.info("SourceManager initialized")
+
+    def reconfigure(self, sources: Dict[str, str]) -> dict:
+        """
+        Apply a new lane -> source mapping, touching only what changed.
+
+        Args:
+            sources: Complete desired mapping of lane names to sources
+
+        Returns:
+            Dictionary listing added, changed, removed and unchanged lanes
+        """
+        summary = {"added": [], "changed": [], "removed": [], "unchanged": []}
+
+        with self.lock:
+            for lane in list(self.desired):
+                if lane not in sources:
+                    summary["removed"].append(lane)
+                    self.desired.pop(lane)
+                    self.pending.pop(lane, None)
+                    self.errors.pop(lane, None)
+                    for table in (self.readers, self.ready):
+                        if lane in table:
+                            self.retired.append(table.pop(lane))
+
+            to_open = []
+            for lane, src in sources.items():
+                if self.desired.get(lane) == src:
+                    summary["unchanged"].append(lane)
+                    continue
+
+                summary["added" if lane not in self.desired else "changed"].append(lane)
+                self.desired[lane] = src
+                self.errors.pop(lane, None)
+                if lane in self.ready:
+                    self.retired.append(self.ready.pop(lane))
+
+                self.generation += 1
+                self.pending[lane] = (src, self.generation)
+                to_open.append((lane, src, self.generation))
+
+        for lane, src, gen in to_open:
+            threading.Thread(
+                target=self._open, args=(lane, src, gen),
+                name=f"open-{lane}", daemon=True
+            ).start()
+
+        logger.info(f"Camera sources reconfigured: {summary}")
+        return summary
+
+    def _open(self, lane: str, src: str, generation: int) -> None:
+        """Open and pre-warm a reader in the background."""
+        reader = make_reader(src, self.decode_side, self.decode_threads)
+        try:
+            reader.open(self.warmup_frames)
+        except Exception as e:
+            logger.error(f"Failed to open source for {lane}: {e}")
+            with self.lock:
+                if self.pending.get(lane) == (src, generation):
+                    self.pending.pop(lane)
+                    self.errors[lane] = str(e)
+            return
+
+        with self.lock:
+            if self.pending.get(lane) == (src, generation):
+                self.pending.pop(lane)
+                self.ready[lane] = reader
+                logger.info(f"Source for {lane} ready: {src}")
+                return
+
+        # Superseded by a newer reconfiguration while opening
+        reader.release()
+
+    def _apply_swaps(self) -> None:
+        """Swap in pre-warmed readers and release retired ones."""
+        with self.lock:
+            ready, self.ready = self.ready, {}
+            retired, self.retired = self.retired, []
+
+            for lane, reader in ready.items():
+                old = self.readers.get(lane)
+                if old is not None:
+                    retired.append(old)
+                self.readers[lane] = reader
+
+        # A stalled stream's reader can take seconds to stop - don't hold up sampling
+        if retired:
+            threading.Thread(target=lambda: [r.release() for r in retired],
+                             name="release-readers", daemon=True).start()
+
+    def lanes(self) -> list:
+        """
+        Lanes that have an active reader or one that the next grab() swaps in.
+        Does not touch the readers, so it is safe to call from the event loop.
+        """
+        with self.lock:
+            return list(self.readers) + [lane for lane in self.ready if lane not in self.readers]
+
+    def grab(self, lanes: Optional[Iterable[str]] = None) -> Dict[str, Optional[np.ndarray]]:
+        """
+        Read the current frame from the active readers for the given lanes.
+
+        File sources advance by the wall time elapsed since their last grab;
+        live streams hand over the newest frame decoded by their thread.
+        Cache keys for the returned frames are left in self.frame_keys.
+
+        Args:
+            lanes: Lanes to read (defaults to every active lane)
+
+        Returns:
+            Dictionary with the latest frame per lane (None if unavailable)
+        """
+        self._apply_swaps()
+        # Keep the caller's order (the scheduler lists the most urgent lanes first)
+        order = self.readers if lanes is None else lanes
+        readers = {l: self.readers[l] for l in order if l in self.readers}
+        latest, keys = {}, {}
+
+        now = time.time()
+        for lane, reader in readers.items():
+            if reader.live:
+                ok, f = reader.read()
+            else:
+                ok, f = reader.advance(now - (reader.last_advance or now))
+                reader.last_advance = now
+            latest[lane] = f if ok else None
+            keys[lane] = reader.cache_key() if ok else None
+
+        self.frame_keys = keys
+        return latest
+
+    def status(self) -> Dict[str, dict]:
+        """Per-lane configuration and reader state."""
+        with self.lock:
+            result = {}
+            for lane, src in self.desired.items():
+                reader = self.readers.get(lane)
+                if lane in self.pending or lane in self.ready:
+                    state = "opening"
+                elif lane in self.errors:
+                    state = f"error: {self.errors[lane]}"
+                elif reader is not None:
+                    state = "ok"
+                else:
+                    state = "not started"
+
+                result[lane] = {
+                    "source": src,
+                    "state": state,
+                    "active_source": reader.src if reader is not None else None,
+                    "live": is_stream(src),
+                    "stats": reader.stats() if reader is not None else None,
+                }
+            return result
+
+    def close(self) -> None:
+        """Release every reader."""
+        with self.lock:
+            readers = list(self.readers.values()) + list(self.ready.values()) + self.retired
+            self.readers, self.ready, self.retired, self.pending = {}, {}, [], {}
+        for reader in readers:
+            reader.release()
+
+
+# Create source manager instance for export
+source_manager = SourceManager()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app resolves its data directories relative to backend/
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+
+class StubDetector:
+    """Reports one vehicle per 10 px of frame width; no model needed."""
+
+    state = "ready"
+    ready = True
+    load_error = None
+
+    def load(self):
+        pass
+
+    def load_async(self):
+        pass
+
+    def status(self):
+        return {"state": self.state, "error": None, "load_time": 0.0}
+
+    def config_id(self, frame_shape):
+        return "stub"
+
+    def infer_batch(self, frames):
+        return [np.zeros((0, 6), np.float32) for _ in frames]
+
+    def render(self, frame, dets):
+        return self.draw(frame, dets)[0], False, ""
+
+    def draw(self, frame, dets):
+        return frame.shape[1] // 10, False
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+    from fastapi.testclient import TestClient
+
+    stub = StubDetector()
+    monkeypatch.setattr(main, "detector", stub)
+    monkeypatch.setattr(main.inference_service, "detector", stub)
+    monkeypatch.setattr(main, "camera_sources", {})
+    with TestClient(main.app) as c:
+        yield c
@@ -0,0 +1,52 @@
+import os
+import time
+
+import av
+
+from annotate import AnnotationJobs, annotation_jobs
+
+
+def test_video_upload_returns_job_and_reports_summary_from_the_render(client):
+    with open("videos/east.mp4", "rb") as fh:
+        response = client.post("/upload_media", files={"file": ("east.mp4", fh, "video/mp4")})
+    assert response.status_code == 200
+    body = response.json()
+    job_id = body["render_job_id"]
+
+    uploaded = os.path.join("uploaded_media", os.path.basename(body["video_url"]))
+    try:
+        # The upload returns before rendering; results come with the job status
+        assert body["media_type"] == "video"
+        assert body["count"] is None and body["annotated_video_url"] is None
+
+        deadline = time.time() + 60
+        status = client.get(f"/render_jobs/{job_id}").json()
+        assert status["state"] in ("queued", "running", "done")
+        while status["state"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.1)
+            status = client.get(f"/render_jobs/{job_id}").json()
+
+        # Frames are rendered at 960 px; the stub reports width // 10 vehicles
+        assert status["state"] == "done"
+        assert status["count"] == 96 and status["emergency"] is False and status["image"]
+        assert status["frames_analyzed"] > 0
+        assert status["codec"] == "h264" and status["browser_playable"] is True
+        annotated = os.path.join("uploaded_media", os.path.basename(status["annotated_video_url"]))
+        assert annotated == annotation_jobs.get(job_id).output_path
+
+        with av.open(annotated) as container:
+            stream = container.streams.video[0]
+            assert stream.codec_context.name == "h264"
+            assert max(stream.width, stream.height) == 960
+
+        # Another worker only sees the saved status
+        other = AnnotationJobs(status_dir=annotation_jobs.status_dir)
+        assert other.status(job_id)["state"] == "done"
+        assert other.status("../../etc/passwd") is None
+    finally:
+        # Don't leave the render running against the deleted upload
+        job = annotation_jobs.get(job_id)
+        job.future.result(timeout=60)
+        for path in (uploaded, job.output_path, job.status_path):
+            if os.path.exists(path):
+                os.remove(path)
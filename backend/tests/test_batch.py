@@ -0,0 +1,90 @@
+import io
+import os
+import json
+import zipfile
+
+import cv2
+import numpy as np
+
+
+def jpeg(width):
+    _, data = cv2.imencode(".jpg", np.zeros((20, width, 3), np.uint8))
+    return data.tobytes()
+
+
+def test_upload_batch_streams_images_and_archive_members_in_order(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("c.jpg", jpeg(30))
+        zf.writestr("notes.txt", b"not an image")
+        zf.writestr("d.png", b"corrupt")
+        zf.writestr("e.jpg", jpeg(50))
+
+    files = [
+        ("files", ("a.jpg", jpeg(10), "image/jpeg")),
+        ("files", ("b.jpg", jpeg(20), "image/jpeg")),
+        ("files", ("more.zip", archive.getvalue(), "application/zip")),
+    ]
+    response = client.post("/upload_batch", files=files, params={"batch_size": 2})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [line.get("name") for line in lines[:-1]] == [
+        "a.jpg", "b.jpg", "more.zip/c.jpg", "more.zip/notes.txt", "more.zip/d.png", "more.zip/e.jpg"]
+    assert [line["index"] for line in lines[:-1]] == list(range(6))
+    assert [line.get("count") for line in lines[:-1]] == [1, 2, 3, None, None, 5]
+    assert lines[3]["error"] == "not an image"
+    assert lines[4]["error"] == "invalid image format"
+    assert lines[-1] == {"summary": {"images": 4, "errors": 2, "vehicles": 11, "emergencies": 0}}
+
+
+def test_upload_batch_removes_spooled_files_when_client_disconnects(client, monkeypatch, tmp_path):
+    import tempfile
+    import time
+
+    import anyio
+    import httpx
+    import main
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    files = [("files", (f"{i}.jpg", jpeg(10), "image/jpeg")) for i in range(40)]
+    request = httpx.Request("POST", "http://testserver/upload_batch", params={"batch_size": 1}, files=files)
+    body = request.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/upload_batch", "raw_path": b"/upload_batch",
+        "query_string": b"batch_size=1", "root_path": "", "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in request.headers.items()],
+    }
+    sent = []
+
+    async def call():
+        first_line = anyio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Hang up once the first result line is out
+            await first_line.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                sent.append(message["body"])
+                first_line.set()
+
+        await main.app(scope, receive, send)
+
+    client.portal.call(call)
+
+    deadline = time.time() + 5
+    while os.listdir(tmp_path) and time.time() < deadline:
+        time.sleep(0.05)
+    assert 0 < len(sent) < 41
+    assert os.listdir(tmp_path) == []
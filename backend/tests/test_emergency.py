@@ -0,0 +1,39 @@
+import numpy as np
+
+from conftest import StubDetector
+from inference import InferenceService
+
+
+def test_emergency_clears_only_after_the_hold(client):
+    import main
+
+    seen = []
+    bus_publish = main.emergency_bus.publish
+    main.emergency_bus.publish = lambda event: seen.append(event["type"]) or bus_publish(event)
+    hold = main.scheduler.emergency_hold
+    try:
+        main.handle_emergency_result("North", {"count": 3, "emergency": True, "image": ""}, 100.0)
+        # A missed detection inside the hold keeps the emergency
+        main.handle_emergency_result("North", {"count": 3, "emergency": False, "image": ""}, 101.0)
+        main.handle_emergency_result("North", {"count": 3, "emergency": True, "image": ""}, 102.0)
+        main.handle_emergency_result("North", {"count": 3, "emergency": False, "image": ""}, 102.0 + hold - 1)
+        assert seen == ["emergency"] and "North" in main.active_emergencies
+
+        main.handle_emergency_result("North", {"count": 3, "emergency": False, "image": ""}, 102.0 + hold)
+        assert seen == ["emergency", "cleared"] and "North" not in main.active_emergencies
+    finally:
+        main.emergency_bus.publish = bus_publish
+        main.active_emergencies.clear()
+
+
+def test_lanes_without_a_frame_are_not_reported():
+    service = InferenceService(StubDetector())
+    service.start()
+    try:
+        reported = []
+        frames = {"North": np.zeros((10, 40, 3), np.uint8), "South": None}
+        results = service.detect_frames(frames, on_result=lambda lane, result: reported.append(lane))
+        assert reported == ["North"]
+        assert results["South"]["count"] == 0
+    finally:
+        service.stop()
@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from framering import FrameRing, capture_worker
+from inference import InferenceService
+
+VIDEO = os.path.abspath("videos/east.mp4")
+
+
+class RecordingDetector:
+    """Remembers whether the frames it was given live in the ring's shared memory."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.shared = []
+
+    def infer_batch(self, frames):
+        buf = np.frombuffer(self.ring.shm.buf, dtype=np.uint8)
+        self.shared += [np.shares_memory(f, buf) for f in frames]
+        return [np.zeros((0, 6), np.float32) for _ in frames]
+
+    def render(self, frame, dets):
+        return 0, False, ""
+
+
+def test_capture_process_frames_reach_detector_without_copies():
+    ring = FrameRing(["East"], slots=4)
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    worker = ctx.Process(target=capture_worker, args=(ring.name, {"East": VIDEO}),
+                         kwargs={"slots": 4, "stop_event": stop, "fps": 30.0}, daemon=True)
+    worker.start()
+    service = None
+    try:
+        deadline = time.time() + 60
+        while ring.write_counts()["East"] < 2:
+            assert worker.is_alive() and time.time() < deadline, "capture worker produced no frames"
+            time.sleep(0.05)
+
+        token, view, captured_at = ring.read_latest("East")
+        assert token is not None
+        assert view.ndim == 3 and view.shape[2] == 3 and max(view.shape[:2]) <= 640
+        assert np.shares_memory(view, np.frombuffer(ring.shm.buf, dtype=np.uint8))
+        assert time.time() - captured_at < 10
+        del view
+
+        detector = RecordingDetector(ring)
+        service = InferenceService(detector)
+        service.start()
+        result = service.detect_ring(ring, ["East"])
+
+        assert result == {"East": {"count": 0, "emergency": False, "image": ""}}
+        assert detector.shared and all(detector.shared)
+    finally:
+        if service is not None:
+            service.stop()
+        stop.set()
+        worker.join(timeout=10)
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import StubDetector
+from inference import InferenceService, UPLOAD
+
+
+class BlockingDetector(StubDetector):
+    """Holds every batch until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def infer_batch(self, frames):
+        self.release.wait()
+        return super().infer_batch(frames)
+
+
+def test_stopped_service_refuses_work_and_detect_runs_inline():
+    service = InferenceService(StubDetector())
+    frame = np.zeros((10, 40, 3), np.uint8)
+
+    with pytest.raises(RuntimeError):
+        service.submit(frame, UPLOAD)
+    assert service.detect(frame)[:2] == (4, False)
+
+    service.start()
+    service.stop()
+    with pytest.raises(RuntimeError):
+        service.submit(frame, UPLOAD)
+    assert service.detect(frame)[:2] == (4, False)
+
+
+def test_detect_gives_up_after_result_timeout():
+    detector = BlockingDetector()
+    service = InferenceService(detector, result_timeout=0.2)
+    service.start()
+    try:
+        busy = service.submit(np.zeros((10, 10, 3), np.uint8), UPLOAD)
+        time.sleep(0.05)                # let the worker pick it up alone
+        # Times out behind the stuck batch and falls back to the undetected frame
+        assert service.detect(np.zeros((10, 40, 3), np.uint8))[:2] == (0, False)
+        # ... and no longer counts as queued work
+        assert service.get_metrics()["queue_depth"]["upload"] == 0
+    finally:
+        detector.release.set()
+        busy.result(timeout=5)
+        service.stop()
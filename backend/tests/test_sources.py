@@ -0,0 +1,38 @@
+import threading
+import time
+
+from sources import SourceManager
+
+
+class SlowReader:
+    """Reader whose release blocks like a stream stalled inside a read."""
+
+    live = True
+    src = "rtsp://stalled"
+
+    def __init__(self):
+        self.released = threading.Event()
+
+    def read(self):
+        return False, None
+
+    def release(self):
+        time.sleep(1.0)
+        self.released.set()
+
+
+def test_retiring_a_stalled_reader_blocks_neither_lanes_nor_grab():
+    manager = SourceManager()
+    old, new = SlowReader(), SlowReader()
+    manager.readers["North"] = old
+    manager.ready["North"] = new
+    manager.ready["South"] = SlowReader()
+
+    start = time.perf_counter()
+    assert manager.lanes() == ["North", "South"]
+    assert manager.readers["North"] is old          # lanes() swaps nothing in
+
+    assert manager.grab() == {"North": None, "South": None}
+    assert manager.readers["North"] is new
+    assert time.perf_counter() - start < 0.5
+    assert old.released.wait(timeout=5)
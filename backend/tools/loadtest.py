@@ -0,0 +1,493 @@
+"""
+End-to-end load test for the SSE feed and upload endpoints.
+
+Starts the real FastAPI app in a subprocess with a stub detector and a
+replay producer in place of the camera/YOLO pipeline, then opens many local
+SSE clients plus upload traffic and measures:
+
+- delivery latency from cache update to client receipt
+- message loss against the feed's designed cadence (one message per
+  FEED_INTERVAL per client) and duplicates
+- signal-plan cadence slip of the producer (tick times recorded server-side)
+- upload latency and errors
+- server CPU and RSS
+
+Everything runs on localhost; no model weights or cameras are needed.
+
+    python tools/loadtest.py run --clients 2000 --rate 2 --uploads-per-sec 10 \\
+        --duration 60 --report reports/loadtest.json
+    python tools/loadtest.py compare reports/old.json reports/new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEED_INTERVAL = 1.0     # /traffic_feed re-sends the latest cache this often (plus emergency wakeups)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Server side: the app with a stub detector and a replay producer
+
+class StubDetector:
+    """Stands in for TrafficDetector; returns canned results after a fixed delay."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.state = "ready"
+        self.load_error = None
+        self.load_time = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    def load(self):
+        pass
+
+    def load_async(self):
+        pass
+
+    def status(self) -> dict:
+        return {"state": self.state, "error": None, "load_time": 0.0}
+
+    def detect_objects(self, frame, cache_key=None):
+        time.sleep(self.latency)
+        return random.randint(0, 20), random.random() < 0.01, ""
+
+    def config_id(self, frame_shape) -> str:
+        return "stub"
+
+    def infer_batch(self, frames: list) -> list:
+        import numpy as np
+        time.sleep(self.latency)
+        return [np.zeros((0, 6), np.float32) for _ in frames]
+
+    def render(self, frame, dets):
+        return random.randint(0, 20), random.random() < 0.01, ""
+
+
+def load_replay(path: str) -> list:
+    """Per-cycle lane results, one JSON object ({lane: {count, emergency}}) per line."""
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def synthetic_cycle(lanes: list, image_bytes: int) -> dict:
+    image = "A" * image_bytes
+    return {
+        lane: {"count": random.randint(0, 30), "emergency": random.random() < 0.01, "image": image}
+        for lane in lanes
+    }
+
+
+def serve(args) -> None:
+    """Run the app with the camera/model pipeline replaced by a replay producer."""
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    _raise_fd_limit()
+
+    import uvicorn
+    import main
+    from optimizer import optimizer
+
+    replay = load_replay(args.replay) if args.replay else None
+    lanes = [f"Lane{i}" for i in range(args.lanes)]
+
+    # One line per producer tick: when it was due and when it actually ran
+    tick_log = open(args.tick_log, "a", buffering=1) if args.tick_log else None
+
+    async def replay_producer():
+        app = main.app
+        interval = 1.0 / args.rate
+        i = 0
+        next_at = time.time()
+        while not main.stop_event.is_set():
+            ran_at = time.time()
+            data = replay[i % len(replay)] if replay else synthetic_cycle(lanes, args.image_bytes)
+            i += 1
+            cache = app.state.traffic_cache
+            app.state.traffic_cache = {
+                "lanes": data,
+                "signal_times": optimizer.compute_green_time(data),
+                "timestamp": datetime.now().strftime("%H:%M:%S"),
+                "cached_at": time.time(),
+                "seq": cache.get("seq", 0) + 1,
+                "startup_time": cache.get("startup_time", time.time()),
+            }
+            if tick_log is not None:
+                tick_log.write(json.dumps({"seq": app.state.traffic_cache["seq"],
+                                           "due": next_at, "ran": ran_at}) + "\n")
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.time()))
+
+    main.detector = StubDetector(args.detect_latency)
+    main.inference_service.detector = main.detector
+    main.camera_sources = {}
+    main.traffic_poll_task = replay_producer
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Client side
+
+class Stats:
+    def __init__(self):
+        self.latencies = []         # Seconds from cache update to receipt
+        self.received = 0
+        self.duplicates = 0
+        self.skipped = 0            # Cache updates coalesced by the feed (by design above 1/FEED_INTERVAL)
+        self.missed = 0             # Feed intervals in which a client received nothing
+        self.connect_errors = 0
+        self.disconnects = 0
+        self.connected = 0
+        self.ticks = []             # Server-side producer ticks ({seq, due, ran})
+        self.upload_latencies = []
+        self.upload_errors = 0
+        self.server_samples = []    # (cpu_percent, rss_bytes)
+
+
+async def sse_client(host: str, port: int, stats: Stats, stop: asyncio.Event) -> None:
+    try:
+        reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+    except OSError:
+        stats.connect_errors += 1
+        return
+
+    try:
+        writer.write(f"GET /traffic_feed HTTP/1.1\r\nHost: {host}\r\n"
+                     f"Accept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+
+        status = await reader.readline()
+        if b" 200 " not in status:
+            stats.connect_errors += 1
+            return
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        stats.connected += 1
+
+        last_seq, last_receipt = None, time.time()
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                stats.disconnects += 1
+                break
+            if not line.startswith(b"data: "):
+                continue        # chunk-size lines and event separators
+
+            now = time.time()
+            payload = json.loads(line[6:])
+            seq, cached_at = payload.get("seq"), payload.get("cached_at")
+            stats.received += 1
+
+            # The feed promises one message per FEED_INTERVAL; longer silences are losses
+            stats.missed += max(0, round((now - last_receipt) / FEED_INTERVAL) - 1)
+            last_receipt = now
+
+            if seq is None or cached_at is None:
+                continue
+            if seq == last_seq:
+                stats.duplicates += 1
+                continue
+            if last_seq is not None and seq > last_seq + 1:
+                stats.skipped += seq - last_seq - 1
+            last_seq = seq
+            stats.latencies.append(now - cached_at)
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        stats.disconnects += 1
+    finally:
+        writer.close()
+
+
+def make_test_image(width: int, height: int) -> bytes:
+    import cv2
+    import numpy as np
+    img = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    _, jpg = cv2.imencode(".jpg", img)
+    return jpg.tobytes()
+
+
+async def upload_once(host: str, port: int, body: bytes, stats: Stats) -> None:
+    boundary = uuid.uuid4().hex
+    form = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"load.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + body + f"\r\n--{boundary}--\r\n".encode()
+    request = (f"POST /upload_media HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+               f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+               f"Content-Length: {len(form)}\r\n\r\n").encode() + form
+
+    t0 = time.time()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(request)
+        await writer.drain()
+        status = await reader.readline()
+        await reader.read()
+        writer.close()
+        if b" 200 " not in status:
+            stats.upload_errors += 1
+            return
+        stats.upload_latencies.append(time.time() - t0)
+    except OSError:
+        stats.upload_errors += 1
+
+
+async def upload_traffic(host: str, port: int, rate: float, body: bytes,
+                         stats: Stats, stop: asyncio.Event) -> None:
+    if rate <= 0:
+        return
+    tasks = set()
+    while not stop.is_set():
+        task = asyncio.create_task(upload_once(host, port, body, stats))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        await asyncio.sleep(1.0 / rate)
+    if tasks:
+        await asyncio.wait(tasks, timeout=30)
+
+
+async def sample_server(pid: int, stats: Stats, stop: asyncio.Event) -> None:
+    import psutil
+    proc = psutil.Process(pid)
+    proc.cpu_percent(None)
+    while not stop.is_set():
+        await asyncio.sleep(1.0)
+        try:
+            stats.server_samples.append((proc.cpu_percent(None), proc.memory_info().rss))
+        except psutil.Error:
+            break
+
+
+async def wait_ready(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET /livez HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            status = await reader.readline()
+            writer.close()
+            if b" 200 " in status:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become live")
+
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def load_ticks(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def summarize(args, stats: Stats, elapsed: float) -> dict:
+    ms = lambda v: round(1000 * v, 2) if v is not None else None
+    lat = stats.latencies
+    target = 1.0 / args.rate
+    ticks = stats.ticks
+    gaps = [b["ran"] - a["ran"] for a, b in zip(ticks, ticks[1:])]
+    slips = [t["ran"] - t["due"] for t in ticks]
+
+    return {
+        "created": datetime.now().isoformat(),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func", "command")},
+        "elapsed_s": round(elapsed, 2),
+        "sse": {
+            "clients": args.clients,
+            "connected": stats.connected,
+            "connect_errors": stats.connect_errors,
+            "disconnects": stats.disconnects,
+            "messages": stats.received,
+            "duplicates": stats.duplicates,
+            "skipped_updates": stats.skipped,
+            "missed": stats.missed,
+            "loss_ratio": round(stats.missed / max(1, stats.missed + stats.received), 4),
+            "latency_ms": {
+                "p50": ms(percentile(lat, 50)),
+                "p95": ms(percentile(lat, 95)),
+                "p99": ms(percentile(lat, 99)),
+                "max": ms(max(lat) if lat else None),
+            },
+        },
+        "producer": {
+            "ticks": len(ticks),
+            "target_interval_ms": ms(target),
+            "mean_interval_ms": ms(statistics.mean(gaps) if gaps else None),
+            "p95_slip_ms": ms(percentile(slips, 95)),
+            "max_slip_ms": ms(max(slips) if slips else None),
+        },
+        "uploads": {
+            "completed": len(stats.upload_latencies),
+            "errors": stats.upload_errors,
+            "latency_ms": {
+                "p50": ms(percentile(stats.upload_latencies, 50)),
+                "p95": ms(percentile(stats.upload_latencies, 95)),
+                "max": ms(max(stats.upload_latencies) if stats.upload_latencies else None),
+            },
+        },
+        "server": {
+            "cpu_percent_avg": round(statistics.mean(c for c, _ in stats.server_samples), 1) if stats.server_samples else None,
+            "cpu_percent_max": max((c for c, _ in stats.server_samples), default=None),
+            "rss_mb_max": round(max((r for _, r in stats.server_samples), default=0) / 2 ** 20, 1),
+        },
+    }
+
+
+async def run_load(args, server_pid: int, tick_log: str) -> dict:
+    stats, stop = Stats(), asyncio.Event()
+    await wait_ready(args.host, args.port)
+
+    tasks = [asyncio.create_task(sample_server(server_pid, stats, stop))]
+    for i in range(args.clients):
+        tasks.append(asyncio.create_task(sse_client(args.host, args.port, stats, stop)))
+        if args.ramp and i % 100 == 99:
+            await asyncio.sleep(args.ramp)
+
+    body = make_test_image(args.image_width, args.image_height)
+    tasks.append(asyncio.create_task(upload_traffic(args.host, args.port, args.uploads_per_sec, body, stats, stop)))
+
+    start = time.time()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.wait(tasks, timeout=5)
+    for task in tasks:
+        task.cancel()
+
+    # Only ticks inside the measured window count towards cadence slip
+    end = time.time()
+    stats.ticks = [t for t in load_ticks(tick_log) if start <= t["ran"] <= end]
+    return summarize(args, stats, end - start)
+
+
+def run(args) -> None:
+    _raise_fd_limit()
+    cmd = [sys.executable, os.path.abspath(__file__), "serve",
+           "--port", str(args.port), "--rate", str(args.rate), "--lanes", str(args.lanes),
+           "--image-bytes", str(args.image_bytes), "--detect-latency", str(args.detect_latency)]
+    if args.replay:
+        cmd += ["--replay", os.path.abspath(args.replay)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tick_log = os.path.join(tmp, "ticks.jsonl")
+        server = subprocess.Popen(cmd + ["--tick-log", tick_log])
+        try:
+            report = asyncio.run(run_load(args, server.pid, tick_log))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w") as fh:
+            fh.write(text)
+    print(text)
+
+
+def compare(args) -> None:
+    """Print the headline metrics of two reports side by side."""
+    with open(args.baseline) as fh:
+        a = json.load(fh)
+    with open(args.candidate) as fh:
+        b = json.load(fh)
+
+    rows = [
+        ("sse.latency_ms.p50", ("sse", "latency_ms", "p50")),
+        ("sse.latency_ms.p99", ("sse", "latency_ms", "p99")),
+        ("sse.loss_ratio", ("sse", "loss_ratio")),
+        ("sse.connect_errors", ("sse", "connect_errors")),
+        ("producer.p95_slip_ms", ("producer", "p95_slip_ms")),
+        ("producer.max_slip_ms", ("producer", "max_slip_ms")),
+        ("uploads.latency_ms.p95", ("uploads", "latency_ms", "p95")),
+        ("uploads.errors", ("uploads", "errors")),
+        ("server.cpu_percent_avg", ("server", "cpu_percent_avg")),
+        ("server.rss_mb_max", ("server", "rss_mb_max")),
+    ]
+
+    def get(report, path):
+        for key in path:
+            report = report.get(key) if isinstance(report, dict) else None
+        return report
+
+    print(f"{'metric':28} {a.get('git_rev', '?')[:10]:>12} {b.get('git_rev', '?')[:10]:>12}")
+    for name, path in rows:
+        print(f"{name:28} {str(get(a, path)):>12} {str(get(b, path)):>12}")
+
+
+def _raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the traffic backend on localhost")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def server_args(p):
+        p.add_argument("--port", type=int, default=8765)
+        p.add_argument("--rate", type=float, default=1.0, help="Producer cache updates per second")
+        p.add_argument("--lanes", type=int, default=4)
+        p.add_argument("--image-bytes", type=int, default=20000, help="Synthetic per-lane image payload size")
+        p.add_argument("--detect-latency", type=float, default=0.02, help="Stub detector delay per upload")
+        p.add_argument("--replay", help="JSONL file of recorded per-lane results to replay")
+
+    p_serve = sub.add_parser("serve", help="Run the stubbed app (used by 'run')")
+    server_args(p_serve)
+    p_serve.add_argument("--tick-log", help="Append producer tick times (JSONL) here")
+    p_serve.set_defaults(func=serve)
+
+    p_run = sub.add_parser("run", help="Start the stubbed app and drive load against it")
+    server_args(p_run)
+    p_run.add_argument("--host", default="127.0.0.1")
+    p_run.add_argument("--clients", type=int, default=1000)
+    p_run.add_argument("--ramp", type=float, default=0.05, help="Pause after every 100 client connects")
+    p_run.add_argument("--uploads-per-sec", type=float, default=5.0)
+    p_run.add_argument("--image-width", type=int, default=1280)
+    p_run.add_argument("--image-height", type=int, default=720)
+    p_run.add_argument("--duration", type=float, default=30.0)
+    p_run.add_argument("--report", help="Write the JSON report here")
+    p_run.set_defaults(func=run)
+
+    p_cmp = sub.add_parser("compare", help="Compare two reports")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("candidate")
+    p_cmp.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Local stand-in for network cameras.
+
+Serves looping video files as live HTTP (MPEG-TS) streams using ffmpeg, or
+publishes them to a local RTSP server such as mediamtx. Useful for exercising
+the stream ingestion path without real cameras:
+
+    python tools/stream_standin.py videos/east.mp4 --lane East --port 8554
+
+then point the lane at the printed URL via POST /camera_sources.
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import time
+
+
+def ffmpeg_command(path: str, url: str, rtsp: bool) -> list:
+    """Build an ffmpeg command that plays the file in real time, forever."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+           "-re", "-stream_loop", "-1", "-i", path,
+           "-an", "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+           "-g", "30"]
+    if rtsp:
+        cmd += ["-f", "rtsp", "-rtsp_transport", "tcp", url]
+    else:
+        cmd += ["-f", "mpegts", "-listen", "1", url]
+    return cmd
+
+
+def serve(path: str, url: str, rtsp: bool) -> None:
+    """
+    Keep an ffmpeg process running for the stream.
+
+    HTTP listen mode serves a single client and then exits, so the process
+    is restarted whenever it stops - this also lets readers test reconnects.
+    """
+    while True:
+        proc = subprocess.Popen(ffmpeg_command(path, url, rtsp))
+        try:
+            proc.wait()
+        except KeyboardInterrupt:
+            proc.terminate()
+            raise
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a video file as a live camera stream")
+    parser.add_argument("video", help="Video file to loop")
+    parser.add_argument("--lane", default="lane", help="Stream path name")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8554)
+    parser.add_argument("--rtsp", action="store_true",
+                        help="Publish to an RTSP server (e.g. mediamtx) already listening on host:port")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg not found on PATH")
+
+    scheme = "rtsp" if args.rtsp else "http"
+    suffix = "" if args.rtsp else ".ts"
+    url = f"{scheme}://{args.host}:{args.port}/{args.lane}{suffix}"
+    print(f"Serving {args.video} at {url}")
+
+    try:
+        serve(args.video, url, args.rtsp)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
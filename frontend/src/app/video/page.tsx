@@ -53,7 +53,23 @@ export default function VideoAnalysisPage() {
 
       // Use the existing uploadImage API method for both image and video
       // Backend will need to handle the file type appropriately
-      const result = await api.uploadImage(file);
+      let result = await api.uploadImage(file);
+
+      // Videos are analyzed by a background render job - wait for its results
+      if (result.render_job_id) {
+        let job = await api.getRenderJob(result.render_job_id);
+        while (job.state === 'queued' || job.state === 'running') {
+          if (job.progress != null) {
+            toast.loading(`Analyzing video... ${Math.round(job.progress * 100)}%`, { id: toastId });
+          }
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          job = await api.getRenderJob(result.render_job_id);
+        }
+        if (job.state !== 'done') {
+          throw new Error(job.error || 'Video analysis failed');
+        }
+        result = { ...result, ...job };
+      }
 
       setAnalysisResult({
         mediaType,
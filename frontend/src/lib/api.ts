@@ -61,6 +61,14 @@ export const api = {
         return response.data;
     },
 
+    /**
+     * Get progress (and, once done, the analysis results) of a video render job
+     */
+    getRenderJob: async (jobId: string): Promise<any> => {
+        const response = await apiClient.get(`/render_jobs/${jobId}`);
+        return response.data;
+    },
+
     /**
      * Create an EventSource for real-time traffic data
      */